@@ -0,0 +1,158 @@
+"""
+Deterministic local stand-ins for OpenAI embeddings, the chat model and the vector store
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from ..services.local_index import LocalVectorStore
+from ..utils.tokens import count_tokens
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+class FakeEmbeddings(Embeddings):
+    """Unit vectors seeded by a hash of the text, after ``latency`` seconds per request."""
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.0) -> None:
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.random.default_rng(_seed(text)).standard_normal(self.dimensions)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers with the opening words of the prompt's context after a fixed
+    time to first token, then streams ``answer_tokens`` words at
+    ``token_latency`` seconds each. Usage metadata is filled in like OpenAI's."""
+
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    answer_tokens: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _words(self, messages: List[BaseMessage]) -> Tuple[List[str], int]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        context = prompt.split("Context from drawings:", 1)[-1]
+        words = (context.split() or ["No", "context."])[: self.answer_tokens]
+        return [w + " " for w in words], count_tokens(prompt, "gpt-4o-mini")
+
+    def _usage(self, prompt_tokens: int, words: List[str]) -> dict:
+        return {"input_tokens": prompt_tokens, "output_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        words, prompt_tokens = self._words(messages)
+        time.sleep(self.first_token_latency + self.token_latency * len(words))
+        message = AIMessage(content="".join(words), usage_metadata=self._usage(prompt_tokens, words))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        words, prompt_tokens = self._words(messages)
+        await asyncio.sleep(self.first_token_latency + self.token_latency * len(words))
+        message = AIMessage(content="".join(words), usage_metadata=self._usage(prompt_tokens, words))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        words, prompt_tokens = self._words(messages)
+        time.sleep(self.first_token_latency)
+        for word in words:
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt_tokens, words)))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        words, prompt_tokens = self._words(messages)
+        await asyncio.sleep(self.first_token_latency)
+        for word in words:
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt_tokens, words)))
+
+
+class FakeVectorStore(LocalVectorStore):
+    """The local index with a round trip of ``query_latency`` per search and
+    ``upsert_latency`` per write, standing in for a hosted index."""
+
+    def __init__(
+        self,
+        index_dir: str,
+        embedding: Embeddings,
+        namespace: str = "default",
+        query_latency: float = 0.0,
+        upsert_latency: float = 0.0,
+    ) -> None:
+        super().__init__(index_dir, embedding, namespace=namespace)
+        self.query_latency = query_latency
+        self.upsert_latency = upsert_latency
+
+    def add_embeddings(self, texts: List[str], vectors: List[List[float]], metadatas: List[dict], ids: List[str]) -> List[str]:
+        time.sleep(self.upsert_latency)
+        return super().add_embeddings(texts, vectors, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: Optional[bool] = None, **kwargs: Any) -> None:
+        time.sleep(self.upsert_latency)
+        super().delete(ids=ids, delete_all=delete_all, **kwargs)
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        time.sleep(self.query_latency)
+        return super().similarity_search_by_vector_with_score(embedding, k=k, filter=filter, **kwargs)
@@ -0,0 +1,436 @@
+"""
+Offline end-to-end benchmarks: extraction, OCR, ingestion, /upload, /pdf rendering and /chat under load
+
+Runs against the bundled drawings with deterministic stand-ins for OpenAI and
+Pinecone (see :mod:`.fakes`), writes machine-readable results and exits
+non-zero when a metric breaks a threshold or regresses against a baseline::
+
+    python -m backend.app.bench.run --output bench.json
+    python -m backend.app.bench.run --baseline bench.json --tolerance 0.15
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(__file__), "thresholds.json")
+
+CHAT_QUERIES = [
+    "What are the general notes on the site plan?",
+    "What is the height of the guardrail?",
+    "Which drawings show the ceramic tile floor patterns?",
+    "What is the scale of the enlarged site plan on A2.2?",
+    "Where is the fence modification at the museum addition?",
+    "What finish is specified for the wall sections?",
+    "List the dimensions of the courthouse block ground floor.",
+    "Which sheets were approved for issuance and when?",
+]
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile, ``q`` in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _rate(count: float, seconds: float) -> float:
+    return round(count / seconds, 3) if seconds > 0 else 0.0
+
+
+def _configure_environment(data_dir: str, drawings: str) -> None:
+    """Point every store at a scratch directory, ``/pdf`` at ``drawings`` and
+    the app at the stand-in backends.
+
+    Settings are read when ``backend.app.config`` is first imported, so this
+    has to run before any other app module is loaded.
+    """
+    paths = {
+        "LOCAL_INDEX_DIR": "vector_index",
+        "INGEST_MANIFEST_PATH": "ingest_manifest.json",
+        "JOBS_DB_PATH": "ingest_jobs.sqlite3",
+        "UPLOAD_DIR": "uploads",
+        "LEXICAL_INDEX_PATH": "lexical_index.sqlite3",
+        "BOILERPLATE_REGISTRY_PATH": "boilerplate.sqlite3",
+        "SHEET_FACTS_PATH": "sheet_facts.sqlite3",
+        "RENDER_CACHE_DIR": "render_cache",
+        "OCR_CACHE_DIR": "ocr_cache",
+        "EMBEDDING_CACHE_PATH": "embedding_cache.sqlite3",
+        "ANSWER_CACHE_PATH": "answer_cache.sqlite3",
+    }
+    for name, relative in paths.items():
+        os.environ[name] = os.path.join(data_dir, relative)
+    os.environ["DATA_DIR"] = os.path.abspath(drawings)
+    os.environ["VECTOR_BACKEND"] = "local"
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    # Cached embeddings, OCR or answers would measure the caches, not the pipeline
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.environ["OCR_CACHE_ENABLED"] = "false"
+    os.environ["ANSWER_CACHE_ENABLED"] = "false"
+
+
+def _tesseract_error() -> Optional[str]:
+    """Why tesseract cannot run, or None when it can."""
+    import pytesseract
+
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def bench_extraction(paths: List[str]) -> Dict[str, Any]:
+    from ..utils.pdf_extract import extract_documents_from_pdf
+
+    pages = blocks = 0
+    start = time.perf_counter()
+    for path in paths:
+        docs = extract_documents_from_pdf(path, ocr_fallback=False, min_block_chars=1)
+        pages += _page_count(path)
+        blocks += len(docs)
+    seconds = time.perf_counter() - start
+    return {"pages": pages, "blocks": blocks, "seconds": round(seconds, 3), "pages_per_sec": _rate(pages, seconds)}
+
+
+def _page_count(path: str) -> int:
+    from ..utils.pdf_extract import count_pdf_pages
+
+    return count_pdf_pages(path)
+
+
+def bench_ocr(paths: List[str], max_pages: int) -> Dict[str, Any]:
+    """OCR throughput on pages without a text layer."""
+    import fitz  # PyMuPDF
+
+    from ..utils.pdf_extract import extract_documents_from_pdf
+
+    targets = []
+    for path in paths:
+        with fitz.open(path) as pdf:
+            targets.extend((path, i) for i, page in enumerate(pdf) if not page.get_text().strip())
+        if len(targets) >= max_pages:
+            break
+    targets = targets[:max_pages]
+    if not targets:
+        return {"skipped": "no image-only pages"}
+
+    start = time.perf_counter()
+    for path, page_index in targets:
+        extract_documents_from_pdf(path, ocr_fallback=True, pages=[page_index])
+    seconds = time.perf_counter() - start
+    return {"pages": len(targets), "seconds": round(seconds, 3), "pages_per_sec": _rate(len(targets), seconds)}
+
+
+def bench_ingest(rag: Any, vectorstore: Any, paths: List[str], workers: Optional[int]) -> Dict[str, Any]:
+    from ..ingest.ingest import index_pdfs
+
+    start = time.perf_counter()
+    stats = index_pdfs(rag, vectorstore, paths, "default", workers=workers)
+    seconds = time.perf_counter() - start
+    return {
+        "files": stats.files,
+        "pages": stats.pages_extracted,
+        "pages_failed": stats.pages_failed,
+        "chunks": stats.chunks_indexed,
+        "seconds": round(seconds, 3),
+        "pages_per_sec": _rate(stats.pages_extracted + stats.pages_failed, seconds),
+        "chunks_per_sec": _rate(stats.chunks_indexed, seconds),
+        "embed_chunks_per_sec": round(stats.chunks_per_second, 3),
+    }
+
+
+def bench_upload(client: Any, paths: List[str], namespace: str, timeout: float) -> Dict[str, Any]:
+    """POST the files to /upload and poll the job until it finishes."""
+    start = time.perf_counter()
+    handles = [open(path, "rb") for path in paths]
+    try:
+        files = [("files", (os.path.basename(path), handle, "application/pdf")) for path, handle in zip(paths, handles)]
+        response = client.post("/upload", files=files, data={"namespace": namespace})
+    finally:
+        for handle in handles:
+            handle.close()
+    accepted = time.perf_counter() - start
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+
+    job: Dict[str, Any] = {}
+    while time.perf_counter() - start < timeout:
+        job = client.get(f"/upload/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.05)
+    seconds = time.perf_counter() - start
+    chunks = sum(f.get("chunks_indexed") or 0 for f in job.get("files", []))
+    return {
+        "status": job.get("status"),
+        "files": len(paths),
+        "chunks": chunks,
+        "accepted_ms": round(accepted * 1000, 3),
+        "seconds": round(seconds, 3),
+        "chunks_per_sec": _rate(chunks, seconds),
+    }
+
+
+def bench_render(client: Any, paths: List[str], dpi: int) -> Dict[str, Any]:
+    """Latency of /pdf page images, first uncached and then from the render cache."""
+
+    def timed(url: str) -> float:
+        start = time.perf_counter()
+        client.get(url).raise_for_status()
+        return (time.perf_counter() - start) * 1000
+
+    urls = [f"/pdf/{os.path.basename(path)}/page/0?dpi={dpi}" for path in paths]
+    cold = [timed(url) for url in urls]
+    warm = [timed(url) for url in urls]
+    return {
+        "pages": len(urls),
+        "dpi": dpi,
+        "cold_ms_p50": round(percentile(cold, 50), 3),
+        "cold_ms_p95": round(percentile(cold, 95), 3),
+        "warm_ms_p50": round(percentile(warm, 50), 3),
+    }
+
+
+async def _chat_load(app: Any, requests: int, concurrency: int, top_k: int) -> Dict[str, Any]:
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+
+        async def one(i: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/chat", json={"query": CHAT_QUERIES[i % len(CHAT_QUERIES)], "top_k": top_k})
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        seconds = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "requests_per_sec": _rate(requests, seconds),
+        "ms_p50": round(percentile(latencies, 50), 3),
+        "ms_p95": round(percentile(latencies, 95), 3),
+        "ms_p99": round(percentile(latencies, 99), 3),
+    }
+
+
+def flatten(results: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    """Scalar metrics, named ``<benchmark>_<field>``, for thresholds and baselines."""
+    metrics: Dict[str, float] = {}
+    for name, result in results.items():
+        for key, value in result.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metrics[f"{name}_{key}"] = value
+    return metrics
+
+
+def check(
+    metrics: Dict[str, float],
+    thresholds: Dict[str, Dict[str, float]],
+    baseline: Optional[Dict[str, float]] = None,
+    tolerance: float = 0.1,
+) -> List[str]:
+    """Failures against absolute ``min``/``max`` thresholds, and against
+    ``baseline`` for the same metrics with ``tolerance`` slack. The
+    threshold's direction says whether higher or lower is better."""
+    failures: List[str] = []
+    for name, limits in thresholds.items():
+        value = metrics.get(name)
+        if value is None:
+            continue
+        if "min" in limits and value < limits["min"]:
+            failures.append(f"{name} = {value} is below the minimum {limits['min']}")
+        if "max" in limits and value > limits["max"]:
+            failures.append(f"{name} = {value} is above the maximum {limits['max']}")
+        previous = (baseline or {}).get(name)
+        if not previous:
+            continue
+        if "min" in limits and value < previous * (1 - tolerance):
+            failures.append(f"{name} = {value} regressed from {previous} (tolerance {tolerance:.0%})")
+        if "max" in limits and value > previous * (1 + tolerance):
+            failures.append(f"{name} = {value} regressed from {previous} (tolerance {tolerance:.0%})")
+    return failures
+
+
+def _timed_section(
+    name: str, results: Dict[str, Dict[str, Any]], failures: List[str], run: Callable[[], Dict[str, Any]]
+) -> None:
+    """Run one benchmark; an exception is recorded as a failure and the run goes on."""
+    print(f"[bench] {name}...", file=sys.stderr)
+    try:
+        results[name] = run()
+    except Exception as e:
+        traceback.print_exc()
+        results[name] = {"error": f"{type(e).__name__}: {e}"}
+        failures.append(f"{name} failed: {results[name]['error']}")
+    print(f"[bench] {name}: {json.dumps(results[name])}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--drawings", default="drawings", help="Directory of PDFs to benchmark on")
+    parser.add_argument("--limit", type=int, default=10, help="Drawings to use (0 = all)")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes for ingestion")
+    parser.add_argument("--ocr-pages", type=int, default=3)
+    parser.add_argument("--upload-files", type=int, default=2)
+    parser.add_argument("--render-pages", type=int, default=5)
+    parser.add_argument("--render-dpi", type=int, default=150)
+    parser.add_argument("--chat-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per embedding request")
+    parser.add_argument("--llm-first-token", type=float, default=0.3, help="Seconds to the first answer token")
+    parser.add_argument("--llm-token-latency", type=float, default=0.005, help="Seconds per answer token")
+    parser.add_argument("--vector-latency", type=float, default=0.02, help="Seconds per vector search")
+    parser.add_argument("--upsert-latency", type=float, default=0.05, help="Seconds per upsert or delete")
+    parser.add_argument("--skip", default="", help="Comma-separated benchmarks to skip: extract,ocr,ingest,upload,render,chat")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression against --baseline")
+    parser.add_argument("--output", default=None, help="Write results JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    paths = sorted(glob.glob(os.path.join(args.drawings, "**", "*.pdf"), recursive=True))
+    if args.limit:
+        paths = paths[: args.limit]
+    if not paths:
+        print(f"No PDFs found in {args.drawings}", file=sys.stderr)
+        return 2
+    skip = {name.strip() for name in args.skip.split(",") if name.strip()}
+    # Without tesseract most drawings index nothing, which would make every later number meaningless
+    needs_ocr = sorted({"ocr", "ingest", "upload"} - skip)
+    tesseract_error = _tesseract_error() if needs_ocr else None
+    if tesseract_error:
+        print(
+            f"tesseract is required for {', '.join(needs_ocr)}: {tesseract_error.rstrip('.')}. "
+            f"Install it, or pass --skip {','.join(needs_ocr)}.",
+            file=sys.stderr,
+        )
+        return 2
+
+    data_dir = tempfile.mkdtemp(prefix="construction-rag-bench-")
+    try:
+        return _run(args, paths, skip, data_dir)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def _run(args: argparse.Namespace, paths: List[str], skip: set, data_dir: str) -> int:
+    _configure_environment(data_dir, args.drawings)
+
+    from fastapi.testclient import TestClient
+
+    from .fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore
+    from ..config import settings
+    from ..main import app
+    from ..services.registry import registry
+
+    rag = registry.rag_service()
+    rag.embeddings = FakeEmbeddings(latency=args.embed_latency)
+    rag.llm = FakeChatModel(first_token_latency=args.llm_first_token, token_latency=args.llm_token_latency)
+
+    def fake_store(namespace: str) -> FakeVectorStore:
+        return FakeVectorStore(
+            settings.local_index_dir,
+            rag.embeddings,
+            namespace=namespace,
+            query_latency=args.vector_latency,
+            upsert_latency=args.upsert_latency,
+        )
+
+    rag.vectorstore = fake_store(settings.pinecone_namespace)
+    rag._vectorstores["bench-upload"] = fake_store("bench-upload")
+
+    # /pdf serves files by name from DATA_DIR, so nested drawings cannot be rendered
+    drawings = os.path.abspath(args.drawings)
+    render_paths = [p for p in paths if os.path.dirname(os.path.abspath(p)) == drawings]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    failures: List[str] = []
+    with TestClient(app) as client:
+        if "extract" not in skip:
+            _timed_section("extract", results, failures, lambda: bench_extraction(paths))
+        if "ocr" not in skip:
+            _timed_section("ocr", results, failures, lambda: bench_ocr(paths, args.ocr_pages))
+        if "ingest" not in skip:
+            _timed_section("ingest", results, failures, lambda: bench_ingest(rag, rag.vectorstore, paths, args.workers))
+            if not results["ingest"].get("chunks"):
+                # Chat against an empty index, or renders of drawings that did not ingest, would still look healthy
+                failures.append("ingest indexed no chunks; skipped the remaining benchmarks")
+                skip |= {"upload", "render", "chat"}
+                for name in ("upload", "render", "chat"):
+                    results[name] = {"skipped": "ingest indexed no chunks"}
+        elif "chat" not in skip:
+            results["chat"] = {"skipped": "ingest was skipped, so the index is empty"}
+            skip.add("chat")
+        if "upload" not in skip and args.upload_files:
+            _timed_section(
+                "upload", results, failures, lambda: bench_upload(client, paths[: args.upload_files], "bench-upload", timeout=600)
+            )
+        if "render" not in skip and args.render_pages:
+            _timed_section(
+                "render", results, failures, lambda: bench_render(client, render_paths[: args.render_pages], args.render_dpi)
+            )
+        if "chat" not in skip and args.chat_requests:
+            _timed_section(
+                "chat", results, failures, lambda: asyncio.run(_chat_load(app, args.chat_requests, args.concurrency, args.top_k))
+            )
+
+    metrics = flatten(results)
+    with open(args.thresholds, "r", encoding="utf-8") as f:
+        thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("metrics")
+    failures.extend(check(metrics, thresholds, baseline, args.tolerance))
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "thresholds")},
+        "files": [os.path.basename(p) for p in paths],
+        "results": results,
+        "metrics": metrics,
+        "failures": failures,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for failure in failures:
+        print(f"[bench] FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
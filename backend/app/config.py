@@ -15,6 +15,12 @@ class Settings(BaseSettings):
     log_level: str = "info"
     port: int = 8000
     docs_enabled: bool = True
+    warmup_on_startup: bool = False
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    vectorstore_cache_size: int = 32
+    blocking_workers: int = 4  # threads for PDF rendering, OCR and ingestion inside the API
+    metrics_enabled: bool = True  # expose Prometheus metrics on /metrics
 
     # OpenAI
     openai_api_key: Optional[str] = None
@@ -22,6 +28,49 @@ class Settings(BaseSettings):
     openai_embedding_model: str = "text-embedding-3-large"
     openai_embedding_dim: int = 3072
     openai_temperature: float = 0.1
+    prompt_token_budget: int = 8000  # cap on prompt tokens (0 = the model's full context window)
+    answer_token_reserve: int = 1024  # tokens left free in the window for the answer
+    context_merge_gap: float = 6.0  # points between bboxes for same-page chunks to merge
+
+    # Embedding cache
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "data/embedding_cache.sqlite3"
+    embedding_cache_max_entries: int = 200_000
+
+    # Answer cache for /chat
+    answer_cache_enabled: bool = True
+    answer_cache_path: str = "data/answer_cache.sqlite3"
+    answer_cache_max_entries: int = 10_000
+    answer_cache_similarity: float = 0.95  # cosine between query embeddings for a near-duplicate hit
+    answer_cache_ttl_seconds: int = 0  # 0 = keep until evicted or invalidated
+
+    # Vector store backend: "pinecone" or "local"
+    vector_backend: str = "pinecone"
+
+    # Local vector index (vector_backend = "local")
+    local_index_dir: str = "data/vector_index"
+    local_index_mode: str = "exact"  # "exact" or "ivf"
+    local_index_nlist: int = 0  # IVF clusters, 0 = sqrt(rows)
+    local_index_nprobe: int = 8
+    local_index_compact_ratio: float = 0.25  # compact after ingest once this share of rows is deleted
+
+    # Hybrid retrieval: BM25 over chunk text fused with vector results
+    hybrid_search_enabled: bool = True
+    lexical_index_path: str = "data/lexical_index.sqlite3"
+    hybrid_fetch_k: int = 20  # candidates taken from each retriever before fusion
+    rrf_k: int = 60  # reciprocal rank fusion constant
+
+    # Reranking: over-fetch, re-score locally, pass the best few to the LLM
+    rerank_enabled: bool = True
+    rerank_fetch_k: int = 24  # candidates retrieved before reranking
+    rerank_token_budget: int = 1500  # context tokens of reranked chunks (0 = only top_k limits)
+    rerank_min_score_ratio: float = 0.5  # drop candidates scoring under this share of the best
+    rerank_sheet_boost: float = 0.5  # for chunks on, or quoting, a sheet the question names
+    confidence_high_similarity: float = 0.45  # mean vector similarity of sources for "high" confidence
+    confidence_medium_similarity: float = 0.3
+
+    # Retrieval filters
+    sheet_filter_from_query: bool = True  # restrict retrieval to sheet numbers named in the question
 
     # Pinecone
     pinecone_api_key: Optional[str] = None
@@ -39,6 +88,54 @@ class Settings(BaseSettings):
     # Data
     data_dir: str = "data/raw"
 
+    # Rendered page images for the viewer
+    render_cache_dir: str = "data/render_cache"
+    render_cache_memory_mb: int = 256
+    render_default_dpi: int = 150
+    render_max_dpi: int = 600
+    render_tile_size: int = 256
+    render_thumbnail_px: int = 320
+    prerender_on_ingest: bool = False  # store viewer renditions while extracting
+    prerender_format: str = "png"  # "png" or "webp"
+
+    # OCR
+    ocr_dpi: int = 0  # 0 = adaptive: ocr_max_dpi, lowered to keep a region under ocr_max_megapixels
+    ocr_min_dpi: int = 150
+    ocr_max_dpi: int = 300
+    ocr_max_megapixels: float = 40.0
+    ocr_text_density: float = 0.1  # share of the page grid with selectable text above which only raster images are OCR'd
+    ocr_full_page_max_chars: int = 40  # pages with at least this much selectable text are never OCR'd whole
+    ocr_min_image_points: float = 72.0  # embedded images smaller than this on a side are not OCR'd
+    ocr_min_confidence: float = 0.0  # tesseract word confidence (0-100) below which OCR words are dropped
+    ocr_cache_enabled: bool = True
+    ocr_cache_dir: str = "data/ocr_cache"
+
+    # Ingestion
+    ingest_workers: int = 0  # 0 = one process per CPU, 1 = extract in-process
+    ingest_manifest_path: str = "data/ingest_manifest.json"
+    ingest_job_workers: int = 1  # concurrent /upload ingestion jobs
+    ingest_job_extract_workers: int = 2  # extraction processes per /upload job, kept small to spare the API
+    jobs_db_path: str = "data/ingest_jobs.sqlite3"
+    upload_dir: str = "data/uploads"
+
+    # Layout-aware chunking
+    chunk_size: int = 500  # characters per chunk
+    chunk_overlap: int = 50  # only used when a single sentence or OCR page is split
+    layout_gap_x: float = 12.0  # points between blocks on a row to group them
+    layout_gap_y: float = 16.0  # points between blocks in a column to group them
+    layout_min_chunk_chars: int = 12  # isolated fragments shorter than this are dropped
+    boilerplate_min_sheets: int = 3  # sheets a block must repeat on to be stored once
+    boilerplate_registry_path: str = "data/boilerplate.sqlite3"
+    sheet_facts_path: str = "data/sheet_facts.sqlite3"  # per-page N.T.S., scale and dimension index
+
+    # Embedding + upsert pipeline
+    embed_batch_max_tokens: int = 20_000  # tokens per embedding request
+    embed_batch_max_size: int = 256  # chunks per embedding request
+    embed_max_attempts: int = 6  # tries per batch on 429s / transient errors
+    ingest_upsert_concurrency: int = 4  # batches embedded and upserted in parallel
+    ingest_max_pending_batches: int = 8  # batches held in memory before extraction waits
+    upsert_batch_size: int = 100  # vectors per Pinecone upsert request
+
 
 @lru_cache()
 def get_settings() -> Settings:
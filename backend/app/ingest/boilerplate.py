@@ -0,0 +1,172 @@
+"""
+Registry of text blocks that repeat across sheets (title blocks, review stamps)
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+import fitz  # PyMuPDF
+
+from ..services.embedding_cache import normalize_text
+from ..config import settings
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (namespace, key, source)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS blocks_source ON blocks (namespace, source);
+CREATE TABLE IF NOT EXISTS owners (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS files (
+    namespace TEXT NOT NULL,
+    source TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (namespace, source)
+) WITHOUT ROWID;
+"""
+
+
+def block_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).lower().encode("utf-8")).hexdigest()[:32]
+
+
+def page_block_keys(path: str) -> List[Set[str]]:
+    """Keys of the text blocks on each page of a PDF's text layer; no OCR, so this is cheap."""
+    pages: List[Set[str]] = []
+    with fitz.open(path) as pdf:
+        for page in pdf:
+            pages.append(
+                {block_key(block[4]) for block in page.get_text("blocks") or [] if len(block) >= 5 and (block[4] or "").strip()}
+            )
+    return pages
+
+
+def text_block_keys(path: str) -> List[str]:
+    """Keys of every text block in a PDF's text layer."""
+    return sorted(set().union(*page_block_keys(path)))
+
+
+class BoilerplateRegistry:
+    """Which sheets each text block appears on, and which sheet stores it.
+
+    Ingestion records every changed file's block keys before extracting, so
+    a block that repeats on at least ``min_sheets`` sheets is known up
+    front. Such a block is indexed only for the first sheet that claims it
+    and skipped everywhere else. Sheets added later than the owner only see
+    the block as boilerplate once it has reached the threshold.
+
+    When the owner stops containing a block, its claim is released and
+    :meth:`record_file` reports the key, so ingestion can re-extract the
+    block on the sheets that still hold it and one of them takes over.
+    """
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def record_file(self, namespace: str, source: str, keys: Iterable[str], path: str = "") -> List[str]:
+        """Replace the block keys recorded for ``source`` (read from ``path``).
+
+        Returns the keys ``source`` owned but no longer contains; their claims
+        are released.
+        """
+        keys = list(keys)
+        with self._lock:
+            self._conn.execute("DELETE FROM blocks WHERE namespace = ? AND source = ?", (namespace, source))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO blocks (namespace, key, source) VALUES (?, ?, ?)",
+                [(namespace, key, source) for key in keys],
+            )
+            if path:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (namespace, source, path) VALUES (?, ?, ?)", (namespace, source, path)
+                )
+            released = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT key FROM owners WHERE namespace = ? AND source = ? AND key NOT IN "
+                    "(SELECT key FROM blocks WHERE namespace = ? AND source = ?)",
+                    (namespace, source, namespace, source),
+                )
+            ]
+            self._conn.executemany(
+                "DELETE FROM owners WHERE namespace = ? AND key = ?", [(namespace, key) for key in released]
+            )
+            self._conn.commit()
+        return released
+
+    def holders(self, namespace: str, keys: Iterable[str]) -> Dict[str, str]:
+        """``source -> path`` of every recorded sheet containing any of ``keys``."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT b.source, COALESCE(f.path, '') FROM blocks b "
+                "LEFT JOIN files f ON f.namespace = b.namespace AND f.source = b.source "
+                f"WHERE b.namespace = ? AND b.key IN ({','.join('?' * len(keys))})",
+                (namespace, *keys),
+            ).fetchall()
+        return {source: path for source, path in rows}
+
+    def repeated(self, namespace: str, min_sheets: int) -> Set[str]:
+        """Keys of blocks found on at least ``min_sheets`` sources."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM blocks WHERE namespace = ? GROUP BY key HAVING COUNT(*) >= ?",
+                (namespace, min_sheets),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def claim(self, namespace: str, key: str, source: str) -> bool:
+        """True when ``source`` stores the block: it is the first to claim it or already owns it.
+
+        An owner that no longer contains the block loses it to ``source``.
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM owners WHERE namespace = ? AND key = ? AND source NOT IN "
+                "(SELECT source FROM blocks WHERE namespace = ? AND key = ?)",
+                (namespace, key, namespace, key),
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO owners (namespace, key, source) VALUES (?, ?, ?)",
+                (namespace, key, source),
+            )
+            self._conn.commit()
+            owner = self._conn.execute(
+                "SELECT source FROM owners WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return owner is not None and owner[0] == source
+
+
+_shared_registry: Optional[BoilerplateRegistry] = None
+_shared_registry_lock = threading.Lock()
+
+
+def get_boilerplate_registry() -> BoilerplateRegistry:
+    global _shared_registry
+    with _shared_registry_lock:
+        if _shared_registry is None:
+            _shared_registry = BoilerplateRegistry(settings.boilerplate_registry_path)
+        return _shared_registry
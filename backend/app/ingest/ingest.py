@@ -1,49 +1,427 @@
 import argparse
+import multiprocessing
 import os
-from typing import List
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
 from langchain.schema import Document
+from langchain_core.vectorstores import VectorStore
 
+from .boilerplate import block_key, get_boilerplate_registry, page_block_keys, text_block_keys
+from .manifest import IngestManifest, assign_chunk_ids, hash_pdf_pages
+from .pipeline import EmbedUpsertPipeline
+from ..services.answer_cache import get_answer_cache
+from ..services.embedding_cache import CachedEmbeddings
+from ..services.lexical_index import get_lexical_index
+from ..services.sheet_facts import get_sheet_facts
+from ..services.vectorstores import compact_vectorstore
 from ..services.rag import RAGService
-from ..utils.pdf_extract import extract_documents_from_pdf
+from ..utils.construction_validation import construction_validator
+from ..utils.metrics import record_stages, stage, trace
+from ..utils.file_hash import cached_file_hash, hash_file
+from ..utils.pdf_extract import count_pdf_pages, extract_documents_from_pdf
 from ..config import settings
 
 
-def load_pdfs_from_dir(directory: str) -> List[Document]:
+def _init_extract_worker() -> None:
+    # Tesseract spawns its own OpenMP threads; with one process per core that
+    # oversubscribes the CPU, so pin each worker to a single OCR thread.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def _extract_page(
+    path: str, page_index: int, prerender_hash: Optional[str] = None
+) -> Tuple[List[Document], Optional[str], List[Tuple[str, float]]]:
+    # Stage timings are returned rather than recorded: this usually runs in a
+    # worker process whose metrics the API never sees
+    with trace(record=False) as spans:
+        try:
+            # Keep every block; the layout chunker groups the small ones with their neighbours
+            docs = extract_documents_from_pdf(
+                path,
+                ocr_fallback=True,
+                min_block_chars=1,
+                ocr_min_chars=40,
+                pages=[page_index],
+                prerender_hash=prerender_hash,
+            )
+            return docs, None, spans.spans
+        except Exception as e:
+            return [], f"{os.path.basename(path)} page {page_index}: {e}", spans.spans
+
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    workers = settings.ingest_workers if workers is None else workers
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def _page_tasks(paths: List[str], pages: Optional[Dict[str, Sequence[int]]]) -> List[Tuple[str, int]]:
+    tasks: List[Tuple[str, int]] = []
+    for path in paths:
+        if pages is not None and path in pages:
+            tasks.extend((path, page_index) for page_index in pages[path])
+            continue
+        try:
+            page_count = count_pdf_pages(path)
+        except Exception as e:
+            print(f"Skipping {os.path.basename(path)}: {e}")
+            continue
+        tasks.extend((path, page_index) for page_index in range(page_count))
+    return tasks
+
+
+def iter_pdf_pages(
+    paths: List[str],
+    workers: Optional[int] = None,
+    pages: Optional[Dict[str, Sequence[int]]] = None,
+    on_page: Optional[Callable[[str, int, Optional[str]], None]] = None,
+) -> Iterator[Tuple[str, int, List[Document], Optional[str]]]:
+    """Yield ``(path, page, documents, error)`` for each page as it is extracted.
+
+    Pages are fanned out one task per page, and only a few tasks per worker
+    are in flight at a time. Results are yielded in completion order. A slow
+    consumer therefore pauses extraction instead of letting finished pages
+    pile up in memory. ``pages`` optionally restricts a path to the given page
+    indices, and ``on_page(path, page, error)`` is called as each page
+    finishes. A PDF that cannot be opened, or a page that fails to extract,
+    is reported and skipped rather than aborting the run.
+
+    Workers are spawned rather than forked: the API runs this from an ingest
+    job thread, and forking a threaded process can copy locks that are held
+    at that moment and never released in the child.
+    """
+    tasks = _page_tasks(paths, pages)
+
+    prerender_hashes: Dict[str, Optional[str]] = {}
+    if settings.prerender_on_ingest:
+        for path in {path for path, _ in tasks}:
+            prerender_hashes[path] = cached_file_hash(path)
+
+    def finished(
+        path: str, page_index: int, docs: List[Document], error: Optional[str], spans: List[Tuple[str, float]]
+    ):
+        record_stages(spans)
+        if error:
+            print(f"Extraction failed for {error}")
+        for d in docs:
+            d.metadata = {**(d.metadata or {}), "path": path, "source": os.path.basename(path)}
+        if on_page:
+            on_page(path, page_index, error)
+        return path, page_index, docs, error
+
+    workers = _resolve_workers(workers)
+    if workers == 1 or len(tasks) <= 1:
+        for path, page_index in tasks:
+            yield finished(path, page_index, *_extract_page(path, page_index, prerender_hashes.get(path)))
+        return
+
+    max_in_flight = workers * 2
+    remaining = iter(tasks)
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_extract_worker,
+    ) as pool:
+        in_flight: Dict[Future, Tuple[str, int]] = {}
+        while True:
+            for path, page_index in remaining:
+                in_flight[pool.submit(_extract_page, path, page_index, prerender_hashes.get(path))] = (path, page_index)
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, page_index = in_flight.pop(future)
+                yield finished(path, page_index, *future.result())
+
+
+def extract_pdf_pages(
+    paths: List[str],
+    workers: Optional[int] = None,
+    pages: Optional[Dict[str, Sequence[int]]] = None,
+    on_page: Optional[Callable[[str, int, Optional[str]], None]] = None,
+) -> Tuple[Dict[Tuple[str, int], List[Document]], Set[Tuple[str, int]]]:
+    """Collect :func:`iter_pdf_pages` into documents keyed by ``(path, page)``
+    and the set of pages that failed.
+    """
+    results: Dict[Tuple[str, int], List[Document]] = {}
+    failed: Set[Tuple[str, int]] = set()
+    for path, page_index, docs, error in iter_pdf_pages(paths, workers=workers, pages=pages, on_page=on_page):
+        results[(path, page_index)] = docs
+        if error:
+            failed.add((path, page_index))
+    return results, failed
+
+
+def extract_pdfs(paths: List[str], workers: Optional[int] = None) -> List[Document]:
+    """Extract documents from several PDFs in parallel.
+
+    Documents come back ordered by the position of their file in ``paths`` and
+    then by page, regardless of which worker finished first.
+    """
+    results, _ = extract_pdf_pages(paths, workers=workers)
+    order = {path: i for i, path in enumerate(paths)}
     documents: List[Document] = []
+    for key in sorted(results, key=lambda k: (order[k[0]], k[1])):
+        documents.extend(results[key])
+    return documents
+
+
+def find_pdfs(directory: str) -> List[str]:
+    paths: List[str] = []
     for root, _, files in os.walk(directory):
         for f in files:
             if f.lower().endswith(".pdf"):
-                path = os.path.join(root, f)
-                docs = extract_documents_from_pdf(path, ocr_fallback=True, ocr_dpi=300)
-                for d in docs:
-                    d.metadata = {**(d.metadata or {}), "path": path, "source": os.path.basename(path)}
-                documents.extend(docs)
-    return documents
+                paths.append(os.path.join(root, f))
+    return sorted(paths)
+
+
+def load_pdfs_from_dir(directory: str, workers: Optional[int] = None) -> List[Document]:
+    return extract_pdfs(find_pdfs(directory), workers=workers)
 
 
-def main(data_dir: str, namespace: str) -> None:
+def iter_chunks_from_dir(rag: RAGService, directory: str, workers: Optional[int] = None) -> Iterator[Document]:
+    """Extract and split every PDF under ``directory``, one page at a time.
+
+    Unlike :func:`load_pdfs_from_dir`, nothing is accumulated, so memory stays
+    flat regardless of how many sheets the directory holds.
+    """
+    for _, _, docs, _ in iter_pdf_pages(find_pdfs(directory), workers=workers):
+        yield from rag.split_documents(docs)
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    files_unchanged: int = 0
+    pages_extracted: int = 0
+    pages_failed: int = 0
+    documents: int = 0
+    chunks_indexed: int = 0
+    chunks_deleted: int = 0
+    chunks_total: int = 0
+    embed_batches: int = 0
+    embed_retries: int = 0
+    embed_seconds: float = 0.0
+    index_compacted: bool = False
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks_indexed / self.embed_seconds if self.embed_seconds else 0.0
+
+
+@dataclass
+class _FilePlan:
+    source: str
+    file_hash: str
+    page_hashes: List[str]
+    old_pages: Dict[str, Dict[str, Any]]
+    pending: Set[int]
+    pages: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    complete: bool = True
+
+
+def index_pdfs(
+    rag: RAGService,
+    vectorstore: VectorStore,
+    paths: List[str],
+    namespace: str,
+    manifest: Optional[IngestManifest] = None,
+    workers: Optional[int] = None,
+    on_page: Optional[Callable[[str, int, Optional[str]], None]] = None,
+) -> IngestStats:
+    """Incrementally index PDFs into ``vectorstore`` using the ingest manifest.
+
+    Files whose bytes are unchanged are skipped outright. For changed files,
+    only pages whose content hash differs are extracted and split; chunks that
+    already exist (same deterministic id) are not re-embedded, and vectors for
+    chunks that disappeared are deleted. Each page is split as soon as it is
+    extracted and its new chunks stream through :class:`EmbedUpsertPipeline`,
+    so only a bounded window of pages and chunks is ever held in memory.
+    The BM25 index receives the same chunk additions and deletions.
+
+    Pages chunked with different chunker settings count as changed. Text
+    blocks that repeat on ``BOILERPLATE_MIN_SHEETS`` or more sheets (title
+    block and stamp text) are indexed for one sheet only; when that sheet
+    drops such a block, its pages on the other sheets holding it are
+    re-extracted so one of them stores it instead. Every extracted
+    page also gets its N.T.S., scale and dimension facts recorded in the
+    sheet facts index.
+    """
+    manifest = manifest or IngestManifest(settings.ingest_manifest_path)
+    registry = get_boilerplate_registry()
+    chunker = rag.chunker.signature
+    stats = IngestStats(files=len(paths))
+
+    def unchanged(entry: Dict[str, Any], page_hash: Optional[str] = None) -> bool:
+        return entry.get("chunker") == chunker and (page_hash is None or entry.get("hash") == page_hash)
+
+    plans: Dict[str, _FilePlan] = {}
+    to_extract: Dict[str, List[int]] = {}
+
+    def add_plan(path: str, file_hash: str, page_hashes: List[str], old_pages: Dict[str, Any], pending: Set[int]) -> None:
+        plan = _FilePlan(os.path.basename(path), file_hash, page_hashes, old_pages, pending)
+        for page_index in range(len(page_hashes)):
+            if page_index not in plan.pending:
+                plan.pages[page_index] = old_pages[str(page_index)]
+                stats.chunks_total += len(plan.pages[page_index]["chunks"])
+        plans[path] = plan
+        if pending:
+            to_extract[path] = sorted(pending)
+
+    released: Set[str] = set()
+    for path in paths:
+        source = os.path.basename(path)
+        try:
+            file_hash = hash_file(path)
+            previous = manifest.get_file(namespace, source)
+            if (
+                previous
+                and previous["sha256"] == file_hash
+                and all(unchanged(p) for p in previous["pages"].values())
+            ):
+                stats.files_unchanged += 1
+                stats.chunks_total += sum(len(p["chunks"]) for p in previous["pages"].values())
+                continue
+            page_hashes = hash_pdf_pages(path)
+            released.update(registry.record_file(namespace, source, text_block_keys(path), os.path.abspath(path)))
+        except Exception as e:
+            print(f"Skipping {source}: {e}")
+            continue
+        old_pages = previous["pages"] if previous else {}
+        changed = {i for i, h in enumerate(page_hashes) if not unchanged(old_pages.get(str(i), {}), h)}
+        add_plan(path, file_hash, page_hashes, old_pages, changed)
+
+    # Sheets that skipped a block the owner has since dropped must now index it
+    planned = {plan.source: path for path, plan in plans.items()}
+    for source, holder_path in sorted(registry.holders(namespace, released).items()):
+        path = planned.get(source, holder_path)
+        if not path:
+            continue
+        try:
+            pages_with = {i for i, keys in enumerate(page_block_keys(path)) if keys & released}
+            if path not in plans:
+                previous = manifest.get_file(namespace, source)
+                # Never indexed, or changed since: its own next ingest covers it
+                if not previous or previous["sha256"] != hash_file(path):
+                    continue
+                add_plan(path, previous["sha256"], hash_pdf_pages(path), previous["pages"], set())
+        except Exception as e:
+            print(f"Skipping {source}: {e}")
+            continue
+        plan = plans[path]
+        for page_index in pages_with - plan.pending:
+            plan.pending.add(page_index)
+            if page_index in plan.pages:
+                stats.chunks_total -= len(plan.pages.pop(page_index)["chunks"])
+        if plan.pending:
+            to_extract[path] = sorted(plan.pending)
+
+    stale_ids: List[str] = []
+    updates = []
+    lexical_index = get_lexical_index()
+    sheet_facts = get_sheet_facts()
+    boilerplate = registry.repeated(namespace, settings.boilerplate_min_sheets) if to_extract else set()
+
+    def skip_block(doc: Document) -> bool:
+        """Drop blocks repeated across sheets unless this sheet stores them."""
+        key = block_key(doc.page_content)
+        return key in boilerplate and not registry.claim(namespace, key, doc.metadata.get("source", ""))
+
+    def finish_file(plan: _FilePlan) -> None:
+        for key, old in plan.old_pages.items():
+            if int(key) >= len(plan.page_hashes):
+                stale_ids.extend(old["chunks"])
+        sheet_facts.trim_file(namespace, plan.source, len(plan.page_hashes))
+        # A file with failed pages keeps a stale hash so it is revisited
+        updates.append((plan.source, plan.file_hash if plan.complete else "", dict(sorted(plan.pages.items()))))
+
+    def new_chunks() -> Iterator[Tuple[str, Document]]:
+        """Split pages as they are extracted and yield chunks not already in the index."""
+        for plan in plans.values():
+            if not plan.pending:
+                finish_file(plan)
+        if not to_extract:
+            return
+        for path, page_index, docs, error in iter_pdf_pages(
+            list(to_extract), workers=workers, pages=to_extract, on_page=on_page
+        ):
+            plan = plans[path]
+            old = plan.old_pages.get(str(page_index))
+            plan.pending.discard(page_index)
+            if error:
+                # Keep the old entry (if any) so the page is retried next run
+                stats.pages_failed += 1
+                plan.complete = False
+                if old:
+                    plan.pages[page_index] = old
+            else:
+                stats.pages_extracted += 1
+                stats.documents += len(docs)
+                # Facts come from every block, including boilerplate the chunker skips
+                sheet_facts.put_page(namespace, plan.source, page_index, construction_validator.page_facts(docs))
+                with stage("ingest.split"):
+                    chunks = rag.split_documents(docs, skip_block=skip_block)
+                ids = assign_chunk_ids(chunks)
+                old_ids = set(old["chunks"]) if old else set()
+                added = [(chunk_id, chunk) for chunk, chunk_id in zip(chunks, ids) if chunk_id not in old_ids]
+                if lexical_index is not None and added:
+                    lexical_index.add(namespace, [chunk_id for chunk_id, _ in added], [chunk for _, chunk in added])
+                yield from added
+                stale_ids.extend(sorted(old_ids - set(ids)))
+                plan.pages[page_index] = {"hash": plan.page_hashes[page_index], "chunker": chunker, "chunks": ids}
+                stats.chunks_total += len(ids)
+            if not plan.pending:
+                finish_file(plan)
+
+    pipeline = EmbedUpsertPipeline(rag.embeddings, vectorstore)
+    pipeline_stats = pipeline.run(new_chunks())
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+        if lexical_index is not None:
+            lexical_index.delete(namespace, stale_ids)
+    # Deleted and replaced rows leave tombstones in the local index
+    stats.index_compacted = compact_vectorstore(vectorstore)
+    stats.chunks_indexed = pipeline_stats.chunks
+    stats.chunks_deleted = len(stale_ids)
+    stats.embed_batches = pipeline_stats.batches
+    stats.embed_retries = pipeline_stats.retries
+    stats.embed_seconds = pipeline_stats.seconds
+
+    if updates:
+        manifest.commit_files(namespace, updates)
+        answer_cache = get_answer_cache()
+        if answer_cache is not None:
+            # Cached answers citing a re-ingested drawing may no longer be accurate
+            answer_cache.invalidate_sources(namespace, [source for source, _, _ in updates])
+    return stats
+
+
+def main(data_dir: str, namespace: str, workers: Optional[int] = None) -> None:
     rag = RAGService()
-    docs = load_pdfs_from_dir(data_dir)
-    if not docs:
+    paths = find_pdfs(data_dir)
+    if not paths:
         print(f"No PDFs found in {data_dir}")
         return
 
-    chunks = rag.split_documents(docs)
-
-    print(f"Loaded {len(docs)} documents, split into {len(chunks)} chunks. Uploading to Pinecone...")
-
-    # Use a temporary vector store bound to the specified namespace
-    vectorstore = rag.vectorstore
-    if namespace and namespace != settings.pinecone_namespace:
-        from langchain_pinecone import PineconeVectorStore
-        vectorstore = PineconeVectorStore(
-            index_name=settings.pinecone_index_name,
-            embedding=rag.embeddings,
-            namespace=namespace,
+    stats = index_pdfs(rag, rag.vectorstore_for(namespace), paths, namespace, workers=workers)
+    print(
+        f"Processed {stats.files} files ({stats.files_unchanged} unchanged), "
+        f"extracted {stats.pages_extracted} pages into {stats.documents} documents. "
+        f"Indexed {stats.chunks_indexed} new chunks, deleted {stats.chunks_deleted} stale chunks."
+    )
+    if stats.index_compacted:
+        print("Compacted the local vector index.")
+    if stats.chunks_indexed:
+        print(
+            f"Embedded and upserted {stats.chunks_indexed} chunks in {stats.embed_batches} batches "
+            f"({stats.chunks_per_second:.1f} chunks/s, {stats.embed_retries} retries)."
         )
-
-    vectorstore.add_documents(chunks)
+    if isinstance(rag.embeddings, CachedEmbeddings):
+        cache_stats = rag.embeddings.cache.stats()
+        print(f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries.")
     print("Ingestion complete.")
 
 
@@ -51,6 +429,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--data_dir", default=settings.data_dir)
     parser.add_argument("--namespace", default=settings.pinecone_namespace)
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (0 = one per CPU)")
     args = parser.parse_args()
-    main(args.data_dir, args.namespace)
+    main(args.data_dir, args.namespace, workers=args.workers)
 
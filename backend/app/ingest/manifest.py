@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from langchain.schema import Document
+
+from ..utils.file_hash import hash_file, hash_pdf_page
+
+
+MANIFEST_VERSION = 1
+
+_commit_lock = threading.Lock()
+
+
+def hash_pdf_pages(path: str) -> List[str]:
+    """Content hash per page; see :func:`hash_pdf_page`."""
+    with fitz.open(path) as pdf:
+        memo: Dict[int, Any] = {}
+        return [hash_pdf_page(pdf, page, memo) for page in pdf]
+
+
+def assign_chunk_ids(chunks: List[Document]) -> List[str]:
+    """Give each chunk a deterministic id derived from its source, page and text.
+
+    Identical text on the same page gets an occurrence suffix so ids stay
+    unique. The id is also written to ``metadata["chunk_id"]``.
+    """
+    seen: Dict[str, int] = {}
+    ids: List[str] = []
+    for chunk in chunks:
+        metadata = chunk.metadata or {}
+        key = f"{metadata.get('source', '')}|{metadata.get('page', '')}|{chunk.page_content}"
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        chunk_id = hashlib.sha256(f"{key}|{occurrence}".encode()).hexdigest()[:32]
+        chunk.metadata = {**metadata, "chunk_id": chunk_id}
+        ids.append(chunk_id)
+    return ids
+
+
+class IngestManifest:
+    """Persistent record of what has been indexed, per namespace and source file.
+
+    Layout::
+
+        {"version": 1, "namespaces": {ns: {source: {
+            "sha256": ..., "pages": {"0": {"hash": ..., "chunker": ..., "chunks": [ids]}}}}}}
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._data: Dict[str, Any] = {"version": MANIFEST_VERSION, "namespaces": {}}
+        self._load()
+
+    def _load(self) -> None:
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self._data = data
+            except (OSError, ValueError):
+                # A corrupt manifest only costs a full re-ingest
+                pass
+
+    def get_file(self, namespace: str, source: str) -> Optional[Dict[str, Any]]:
+        return self._data["namespaces"].get(namespace, {}).get(source)
+
+    def set_file(self, namespace: str, source: str, sha256: str, pages: Dict[int, Dict[str, Any]]) -> None:
+        self._data["namespaces"].setdefault(namespace, {})[source] = {
+            "sha256": sha256,
+            "pages": {str(page): entry for page, entry in sorted(pages.items())},
+        }
+
+    def remove_file(self, namespace: str, source: str) -> None:
+        self._data["namespaces"].get(namespace, {}).pop(source, None)
+
+    def commit_files(self, namespace: str, updates: List[Tuple[str, str, Dict[int, Dict[str, Any]]]]) -> None:
+        """Apply ``(source, sha256, pages)`` updates on top of the latest file and save.
+
+        Reloading under a process-wide lock keeps concurrent ingestion jobs
+        from overwriting each other's entries.
+        """
+        with _commit_lock:
+            self._load()
+            for source, sha256, pages in updates:
+                self.set_file(namespace, source, sha256, pages)
+            self.save()
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self.path)
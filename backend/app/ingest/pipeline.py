@@ -0,0 +1,176 @@
+"""
+Batched embedding and upsert of chunks with retries and backpressure
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Set, Tuple
+
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from tenacity import RetryCallState, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from ..config import settings
+from ..services.vectorstores import upsert_embeddings
+from ..utils.metrics import record_tokens, stage
+from ..utils.tokens import count_tokens
+
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for rate limits, server errors, timeouts and dropped connections."""
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import httpx
+        import openai
+        import urllib3
+
+        return isinstance(exc, (openai.APIConnectionError, httpx.TransportError, urllib3.exceptions.HTTPError))
+    except ImportError:
+        return False
+
+
+@dataclass
+class PipelineStats:
+    chunks: int = 0
+    batches: int = 0
+    tokens: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+
+class EmbedUpsertPipeline:
+    """Embed chunks in token-sized batches and upsert them concurrently.
+
+    Chunks are pulled lazily from the input, so extraction can still be
+    producing while earlier batches are embedded and written. At most
+    ``max_pending_batches`` batches are held in memory; when that many are in
+    flight, :meth:`run` blocks until one finishes. Each batch's embed and
+    upsert calls are retried with jittered exponential backoff on rate limits
+    and transient errors.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        vectorstore: VectorStore,
+        *,
+        model: Optional[str] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_pending_batches: Optional[int] = None,
+        upsert_batch_size: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+    ) -> None:
+        self.embeddings = embeddings
+        self.vectorstore = vectorstore
+        self.model = model or settings.openai_embedding_model
+        self.max_batch_tokens = max_batch_tokens or settings.embed_batch_max_tokens
+        self.max_batch_size = max_batch_size or settings.embed_batch_max_size
+        self.concurrency = max(1, concurrency or settings.ingest_upsert_concurrency)
+        self.max_pending_batches = max(self.concurrency, max_pending_batches or settings.ingest_max_pending_batches)
+        self.upsert_batch_size = upsert_batch_size or settings.upsert_batch_size
+        self.max_attempts = max_attempts or settings.embed_max_attempts
+        self._stats_lock = threading.Lock()
+
+    def _retrying(self, stats: PipelineStats) -> Retrying:
+        def count_retry(state: RetryCallState) -> None:
+            with self._stats_lock:
+                stats.retries += 1
+            logger.warning("Retrying after %r (attempt %d)", state.outcome.exception(), state.attempt_number)
+
+        return Retrying(
+            retry=retry_if_exception(is_retryable),
+            wait=wait_random_exponential(multiplier=0.5, max=30),
+            stop=stop_after_attempt(self.max_attempts),
+            before_sleep=count_retry,
+            reraise=True,
+        )
+
+    def _process(self, batch: List[Tuple[str, Document]], stats: PipelineStats) -> None:
+        ids = [chunk_id for chunk_id, _ in batch]
+        texts = [doc.page_content for _, doc in batch]
+        metadatas = [dict(doc.metadata or {}) for _, doc in batch]
+        with stage("ingest.embed"):
+            vectors = self._retrying(stats)(self.embeddings.embed_documents, texts)
+        with stage("ingest.upsert"):
+            self._retrying(stats)(
+                upsert_embeddings, self.vectorstore, ids, texts, vectors, metadatas, batch_size=self.upsert_batch_size
+            )
+
+    def _batches(self, chunks: Iterable[Tuple[str, Document]], stats: PipelineStats) -> Iterable[List[Tuple[str, Document]]]:
+        batch: List[Tuple[str, Document]] = []
+        batch_tokens = 0
+        for chunk_id, doc in chunks:
+            tokens = count_tokens(doc.page_content, self.model)
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                record_tokens("embedding", batch_tokens)
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append((chunk_id, doc))
+            batch_tokens += tokens
+            stats.tokens += tokens
+        if batch:
+            record_tokens("embedding", batch_tokens)
+            yield batch
+
+    @staticmethod
+    def _cancel(pending: Set[Future]) -> None:
+        for future in pending:
+            future.cancel()
+
+    def run(self, chunks: Iterable[Tuple[str, Document]]) -> PipelineStats:
+        """Embed and upsert ``(chunk_id, document)`` pairs; raises the first batch error."""
+        stats = PipelineStats()
+        started = time.perf_counter()
+        slots = threading.BoundedSemaphore(self.max_pending_batches)
+        pending: Set[Future] = set()
+        errors: List[BaseException] = []
+
+        def on_done(future: Future) -> None:
+            slots.release()
+            if not future.cancelled() and future.exception() is not None:
+                errors.append(future.exception())
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed-upsert") as pool:
+            try:
+                for batch in self._batches(chunks, stats):
+                    slots.acquire()
+                    if errors:
+                        slots.release()
+                        break
+                    future = pool.submit(self._process, batch, stats)
+                    stats.batches += 1
+                    stats.chunks += len(batch)
+                    pending = {f for f in pending if not f.done()}
+                    pending.add(future)
+                    future.add_done_callback(on_done)
+            except BaseException:
+                self._cancel(pending)
+                raise
+            if errors:
+                # Stop queued batches from starting once anything has failed
+                self._cancel(pending)
+
+        stats.seconds = time.perf_counter() - started
+        if errors:
+            raise errors[0]
+        return stats
@@ -0,0 +1,62 @@
+"""
+Backfill viewer renditions (standard page image + thumbnail) for drawings
+that were ingested before PRERENDER_ON_INGEST was enabled.
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from .ingest import _init_extract_worker, _resolve_workers, find_pdfs
+from ..utils.file_hash import hash_file
+from ..utils.render_cache import prerender_page
+from ..config import settings
+
+
+def _prerender_file(path: str) -> Tuple[int, int, Optional[str]]:
+    """Render missing renditions for every page; returns (rendered, skipped, error)."""
+    rendered = skipped = 0
+    try:
+        file_hash = hash_file(path)
+        with fitz.open(path) as pdf:
+            for page_index in range(len(pdf)):
+                if prerender_page(pdf[page_index], page_index, file_hash):
+                    rendered += 1
+                else:
+                    skipped += 1
+    except Exception as e:
+        return rendered, skipped, f"{os.path.basename(path)}: {e}"
+    return rendered, skipped, None
+
+
+def main(directories: List[str], workers: Optional[int] = None) -> None:
+    paths: List[str] = []
+    for directory in directories:
+        if os.path.isdir(directory):
+            paths.extend(find_pdfs(directory))
+    if not paths:
+        print(f"No PDFs found in {', '.join(directories)}")
+        return
+
+    rendered = skipped = 0
+    workers = _resolve_workers(workers)
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)), initializer=_init_extract_worker) as pool:
+        futures = [pool.submit(_prerender_file, path) for path in paths]
+        for future in as_completed(futures):
+            file_rendered, file_skipped, error = future.result()
+            rendered += file_rendered
+            skipped += file_skipped
+            if error:
+                print(f"Prerender failed for {error}")
+
+    print(f"Prerendered {rendered} pages across {len(paths)} files ({skipped} already cached).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dirs", nargs="+", default=["drawings", settings.data_dir])
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (0 = one per CPU)")
+    args = parser.parse_args()
+    main(args.dirs, workers=args.workers)
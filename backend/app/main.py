@@ -1,14 +1,33 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from .config import settings
+from .services.jobs import get_job_queue
+from .services.registry import registry
+from .utils.metrics import render_latest
 from .routers.chat import router as chat_router
 from .routers.upload import router as upload_router
 from .routers.pdf import router as pdf_router
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.warmup_on_startup:
+        await run_in_threadpool(registry.warmup)
+    # Pick up ingestion jobs interrupted by a previous shutdown
+    await run_in_threadpool(get_job_queue().resume)
+    yield
+    get_job_queue().shutdown()
+    await registry.aclose()
+
+
 def create_app() -> FastAPI:
     app = FastAPI(
+        lifespan=lifespan,
         title="Construction RAG API",
         version="0.1.0",
         docs_url="/docs" if settings.docs_enabled else None,
@@ -32,6 +51,12 @@ def create_app() -> FastAPI:
     async def healthz():
         return {"status": "ok"}
 
+    if settings.metrics_enabled:
+        @app.get("/metrics", include_in_schema=False)
+        async def metrics():
+            # Prometheus text exposition format
+            return PlainTextResponse(render_latest(), media_type="text/plain; version=0.0.4")
+
     app.include_router(chat_router)
     app.include_router(upload_router)
     app.include_router(pdf_router)
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException
+import json
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import AsyncIterator, List, Optional, Dict
 
 from ..services.rag import RAGService
+from ..services.registry import get_rag_service
 from ..config import settings
+from ..utils.metrics import Trace, stage, trace
 
 
 router = APIRouter(prefix="", tags=["chat"])
@@ -14,11 +19,24 @@ class ChatMessage(BaseModel):
     content: str
 
 
+class RetrievalFilters(BaseModel):
+    sources: Optional[List[str]] = None  # drawing file names, e.g. "A3.2_-_FIRST_FLOOR_PLAN_6760.pdf"
+    sheets: Optional[List[str]] = None  # exact sheet numbers, e.g. "A3.2"
+    sheet_prefix: Optional[str] = None  # e.g. "A3" matches A3.0, A3.2.1, ...
+    discipline: Optional[str] = None  # "architectural", "structural", ... or a designator like "S"
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+    ocr: Optional[bool] = None  # True = OCR text only, False = vector text only
+    detect_sheets: Optional[bool] = None  # filter on sheet numbers named in the query (default from settings)
+
+
 class ChatRequest(BaseModel):
     query: str = Field(..., min_length=1)
     top_k: int = 6
     namespace: Optional[str] = None
     conversation_history: Optional[List[Dict[str, str]]] = None
+    filters: Optional[RetrievalFilters] = None
+    debug: bool = False  # include per-stage timings, token counts and cache results
 
 
 class BoundingBox(BaseModel):
@@ -30,7 +48,8 @@ class BoundingBox(BaseModel):
 
 class Source(BaseModel):
     id: str
-    score: float
+    score: Optional[float] = None  # vector similarity to the query; None when only BM25 found the chunk
+    scores: Dict[str, float] = {}  # raw retrieval scores: vector, lexical, fused, rerank
     metadata: dict
     drawing_name: Optional[str] = None
     page_number: Optional[int] = None
@@ -38,72 +57,158 @@ class Source(BaseModel):
     text_content: Optional[str] = None
 
 
+class StageTiming(BaseModel):
+    stage: str
+    ms: float
+
+
+class ChatDebug(BaseModel):
+    stages: List[StageTiming]
+    tokens: Dict[str, int]
+    caches: Dict[str, str]  # cache name -> last result ("hit", "near_hit", "miss")
+
+
 class ChatResponse(BaseModel):
     answer: str
     sources: List[Source]
     confidence: Optional[str] = None  # "high", "medium", "low"
     drawings_referenced: List[str] = []
-
-
-rag_service: Optional[RAGService] = None
+    debug: Optional[ChatDebug] = None
+
+
+def _debug_block(spans: Trace) -> ChatDebug:
+    return ChatDebug(
+        stages=[StageTiming(stage=name, ms=round(seconds * 1000, 3)) for name, seconds in spans.spans],
+        tokens=dict(spans.tokens),
+        caches=dict(spans.caches),
+    )
+
+
+def _filter_args(req: ChatRequest) -> Optional[dict]:
+    return req.filters.model_dump(exclude_none=True) if req.filters else None
+
+
+def _drawings_referenced(sources: List[dict]) -> List[str]:
+    return list(set([
+        s["metadata"].get("source", "").replace(".pdf", "") 
+        for s in sources if s["metadata"].get("source")
+    ]))
+
+
+def _assess_confidence(sources: List[dict], confidence_override: Optional[str]) -> str:
+    # Use construction validator confidence override if provided, otherwise use simple scoring
+    if confidence_override:
+        return confidence_override
+    # Scores are similarities, so higher is better
+    similarities = [s["score"] for s in sources if s.get("score") is not None]
+    if not similarities:
+        return "low"
+    avg_score = sum(similarities) / len(similarities)
+    if avg_score >= settings.confidence_high_similarity and len(similarities) >= 2:
+        return "high"
+    return "medium" if avg_score >= settings.confidence_medium_similarity else "low"
+
+
+def _to_source_models(sources: List[dict]) -> List[Source]:
+    enhanced_sources = []
+    for s in sources:
+        # Parse bbox coordinates if available
+        bbox = None
+        bbox_str = s["metadata"].get("bbox")
+        if bbox_str and isinstance(bbox_str, str):
+            try:
+                coords = [float(x) for x in bbox_str.split(",")]
+                if len(coords) == 4:
+                    bbox = BoundingBox(x0=coords[0], y0=coords[1], x1=coords[2], y1=coords[3])
+            except (ValueError, IndexError):
+                bbox = None
+        
+        enhanced_sources.append(Source(
+            id=s["id"], 
+            score=s.get("score"),
+            scores=s.get("scores") or {},
+            metadata=s["metadata"],
+            drawing_name=s["metadata"].get("source", "").replace(".pdf", ""),
+            page_number=int(s["metadata"].get("page", 0)) if s["metadata"].get("page") is not None else None,
+            bbox=bbox,
+            text_content=s.get("text_content")
+        ))
+    return enhanced_sources
 
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+async def chat(req: ChatRequest, rag_service: RAGService = Depends(get_rag_service)):
     try:
-        global rag_service
-        if rag_service is None:
-            rag_service = RAGService()
         namespace = req.namespace or settings.pinecone_namespace
-        answer, sources, confidence_override = rag_service.answer_query(
-            query=req.query, 
-            top_k=req.top_k, 
-            namespace=namespace,
-            conversation_history=req.conversation_history
-        )
-        
-        # Extract drawing names and assess confidence
-        drawings_referenced = list(set([
-            s["metadata"].get("source", "").replace(".pdf", "") 
-            for s in sources if s["metadata"].get("source")
-        ]))
-        
-        # Use construction validator confidence override if provided, otherwise use simple scoring
-        if confidence_override:
-            confidence = confidence_override
-        else:
-            avg_score = sum(s["score"] for s in sources) / len(sources) if sources else 0
-            confidence = "high" if avg_score < 0.3 and len(sources) >= 3 else "medium" if avg_score < 0.5 else "low"
-        
-        enhanced_sources = []
-        for s in sources:
-            # Parse bbox coordinates if available
-            bbox = None
-            bbox_str = s["metadata"].get("bbox")
-            if bbox_str and isinstance(bbox_str, str):
-                try:
-                    coords = [float(x) for x in bbox_str.split(",")]
-                    if len(coords) == 4:
-                        bbox = BoundingBox(x0=coords[0], y0=coords[1], x1=coords[2], y1=coords[3])
-                except (ValueError, IndexError):
-                    bbox = None
-            
-            enhanced_sources.append(Source(
-                id=s["id"], 
-                score=s["score"], 
-                metadata=s["metadata"],
-                drawing_name=s["metadata"].get("source", "").replace(".pdf", ""),
-                page_number=int(s["metadata"].get("page", 0)) if s["metadata"].get("page") is not None else None,
-                bbox=bbox,
-                text_content=s.get("text_content")
-            ))
+        with trace() as spans, stage("chat.total"):
+            answer, sources, confidence_override = await rag_service.aanswer_query(
+                query=req.query, 
+                top_k=req.top_k, 
+                namespace=namespace,
+                conversation_history=req.conversation_history,
+                filters=_filter_args(req),
+            )
         
         return ChatResponse(
             answer=answer,
-            sources=enhanced_sources,
-            confidence=confidence,
-            drawings_referenced=drawings_referenced
+            sources=_to_source_models(sources),
+            confidence=_assess_confidence(sources, confidence_override),
+            drawings_referenced=_drawings_referenced(sources),
+            debug=_debug_block(spans) if req.debug else None,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, rag_service: RAGService = Depends(get_rag_service)):
+    """
+    Server-Sent Events variant of /chat.
+
+    Emits ``sources`` (sources + drawings_referenced) as soon as retrieval
+    finishes, one ``token`` event per streamed answer fragment, then ``done``
+    with the validated answer, warnings and confidence. Failures after the
+    stream has started are reported as an ``error`` event.
+    """
+    namespace = req.namespace or settings.pinecone_namespace
+
+    async def event_stream() -> AsyncIterator[str]:
+        sources: List[dict] = []
+        try:
+            with trace() as spans:
+                async for event in rag_service.astream_answer(
+                    query=req.query,
+                    top_k=req.top_k,
+                    namespace=namespace,
+                    conversation_history=req.conversation_history,
+                    filters=_filter_args(req),
+                ):
+                    if event["event"] == "sources":
+                        sources = event["sources"]
+                        yield _sse("sources", {
+                            "sources": [s.model_dump() for s in _to_source_models(sources)],
+                            "drawings_referenced": _drawings_referenced(sources),
+                        })
+                    elif event["event"] == "token":
+                        yield _sse("token", {"text": event["text"]})
+                    elif event["event"] == "done":
+                        done = {
+                            "answer": event["answer"],
+                            "warnings": event["warnings"],
+                            "confidence": _assess_confidence(sources, event["confidence_override"]),
+                        }
+                        if req.debug:
+                            done["debug"] = _debug_block(spans).model_dump()
+                        yield _sse("done", done)
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
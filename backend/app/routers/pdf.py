@@ -1,74 +1,191 @@
-from fastapi import APIRouter, HTTPException
+from functools import partial
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import Response
 import fitz  # PyMuPDF
 import os
 from ..config import settings
+from ..utils.executor import run_blocking
+from ..utils.file_hash import cached_file_hash
+from ..utils.render_cache import (
+    IMAGE_FORMATS,
+    max_tile_zoom,
+    render_cache,
+    render_page,
+    render_thumbnail,
+    render_tile,
+)
 
 router = APIRouter(prefix="/pdf", tags=["pdf"])
 
 
+def _resolve_pdf_path(filename: str) -> str:
+    # Construct the full path to the PDF (check both data_dir and drawings folder)
+    pdf_path = os.path.join("drawings", filename)
+    if not os.path.exists(pdf_path):
+        pdf_path = os.path.join(settings.data_dir, filename)
+
+    # Security check - ensure the file exists
+    if not os.path.exists(pdf_path):
+        raise HTTPException(status_code=404, detail="PDF not found")
+    return pdf_path
+
+
+def _read_pdf_info(pdf_path: str) -> list:
+    with fitz.open(pdf_path) as pdf:
+        page_info = []
+        for page_num in range(len(pdf)):
+            page = pdf[page_num]
+            rect = page.rect
+            page_info.append({
+                "page": page_num,
+                "width": rect.width,
+                "height": rect.height,
+                "tile_size": settings.render_tile_size,
+                "max_zoom": max_tile_zoom(rect, settings.render_tile_size, settings.render_max_dpi),
+            })
+        return page_info
+
+
+def _cached_image_response(key: str, fmt: str, data: Optional[bytes] = None) -> Response:
+    headers = {
+        "ETag": f'"{key}"',
+        # Keys are content-addressed, so browsers may keep images for a day and then revalidate
+        "Cache-Control": "public, max-age=86400, must-revalidate",
+    }
+    if data is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=IMAGE_FORMATS[fmt], headers=headers)
+
+
+def _not_modified(request: Request, key: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    return any(tag.strip() in (f'"{key}"', f'W/"{key}"', "*") for tag in if_none_match.split(","))
+
+
 @router.get("/{filename}/page/{page_num}")
-async def get_pdf_page_image(filename: str, page_num: int):
+async def get_pdf_page_image(
+    filename: str,
+    page_num: int,
+    request: Request,
+    dpi: int = Query(settings.render_default_dpi, ge=36, le=settings.render_max_dpi),
+    fmt: str = Query("png", pattern="^(png|webp|jpeg)$"),
+):
     """
-    Serve a PDF page as a PNG image for frontend display and highlighting
+    Serve a PDF page as an image for frontend display and highlighting.
+
+    Renders are cached by file hash, page, DPI and format, and responses carry
+    an ETag so browsers can revalidate with If-None-Match.
     """
     try:
-        # Construct the full path to the PDF (check both data_dir and drawings folder)
-        pdf_path = os.path.join("drawings", filename)
-        if not os.path.exists(pdf_path):
-            pdf_path = os.path.join(settings.data_dir, filename)
-        
-        # Security check - ensure the file exists
-        if not os.path.exists(pdf_path):
-            raise HTTPException(status_code=404, detail="PDF not found")
-        
-        # Open PDF and get the specified page
-        with fitz.open(pdf_path) as pdf:
-            if page_num < 0 or page_num >= len(pdf):
-                raise HTTPException(status_code=404, detail="Page not found")
-            
-            page = pdf[page_num]
-            
-            # Render page to PNG at high DPI for good quality
-            pix = page.get_pixmap(dpi=150)
-            img_data = pix.tobytes("png")
-            
-            return Response(content=img_data, media_type="image/png")
-            
+        pdf_path = _resolve_pdf_path(filename)
+        file_hash = await run_blocking(cached_file_hash, pdf_path)
+        key = render_cache.make_key(file_hash, page_num, dpi, fmt)
+        if _not_modified(request, key):
+            return _cached_image_response(key, fmt)
+
+        img_data = render_cache.get_memory(key)
+        if img_data is None:
+            img_data = await run_blocking(
+                render_cache.get_or_render, key, partial(render_page, pdf_path, page_num, dpi, fmt)
+            )
+        return _cached_image_response(key, fmt, img_data)
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Page not found")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error rendering PDF page: {str(e)}")
 
 
+@router.get("/{filename}/thumbnail/{page_num}")
+async def get_pdf_page_thumbnail(
+    filename: str,
+    page_num: int,
+    request: Request,
+    fmt: str = Query("png", pattern="^(png|webp|jpeg)$"),
+):
+    """
+    Serve a small preview of a page (longest side ``render_thumbnail_px``)
+    """
+    try:
+        pdf_path = _resolve_pdf_path(filename)
+        file_hash = await run_blocking(cached_file_hash, pdf_path)
+        max_px = settings.render_thumbnail_px
+        key = render_cache.thumbnail_key(file_hash, page_num, max_px, fmt)
+        if _not_modified(request, key):
+            return _cached_image_response(key, fmt)
+
+        img_data = render_cache.get_memory(key)
+        if img_data is None:
+            img_data = await run_blocking(
+                render_cache.get_or_render, key, partial(render_thumbnail, pdf_path, page_num, max_px, fmt)
+            )
+        return _cached_image_response(key, fmt, img_data)
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Page not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering PDF thumbnail: {str(e)}")
+
+
+@router.get("/{filename}/tile/{page_num}/{z}/{x}/{y}")
+async def get_pdf_page_tile(
+    filename: str,
+    page_num: int,
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    fmt: str = Query("png", pattern="^(png|webp|jpeg)$"),
+):
+    """
+    Serve one square tile of a page for pan/zoom viewers.
+
+    Zoom level 0 fits the whole page in a single tile and each level doubles
+    the resolution, up to the deepest level within the max render DPI (see
+    ``max_zoom`` in /info).
+    """
+    try:
+        pdf_path = _resolve_pdf_path(filename)
+        file_hash = await run_blocking(cached_file_hash, pdf_path)
+        tile_size = settings.render_tile_size
+        key = render_cache.make_key(file_hash, page_num, tile_size, fmt, variant=f"tile/{z}/{x}/{y}")
+        if _not_modified(request, key):
+            return _cached_image_response(key, fmt)
+
+        img_data = render_cache.get_memory(key)
+        if img_data is None:
+            img_data = await run_blocking(
+                render_cache.get_or_render,
+                key,
+                partial(render_tile, pdf_path, page_num, z, x, y, tile_size, settings.render_max_dpi, fmt),
+            )
+        return _cached_image_response(key, fmt, img_data)
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering PDF tile: {str(e)}")
+
+
 @router.get("/{filename}/info")
 async def get_pdf_info(filename: str):
     """
     Get basic info about a PDF (page count, dimensions)
     """
     try:
-        # Construct the full path to the PDF (check both data_dir and drawings folder)
-        pdf_path = os.path.join("drawings", filename)
-        if not os.path.exists(pdf_path):
-            pdf_path = os.path.join(settings.data_dir, filename)
-        
-        if not os.path.exists(pdf_path):
-            raise HTTPException(status_code=404, detail="PDF not found")
-        
-        with fitz.open(pdf_path) as pdf:
-            page_info = []
-            for page_num in range(len(pdf)):
-                page = pdf[page_num]
-                rect = page.rect
-                page_info.append({
-                    "page": page_num,
-                    "width": rect.width,
-                    "height": rect.height
-                })
-            
-            return {
-                "filename": filename,
-                "page_count": len(pdf),
-                "pages": page_info
-            }
-            
+        pdf_path = _resolve_pdf_path(filename)
+        page_info = await run_blocking(_read_pdf_info, pdf_path)
+        return {
+            "filename": filename,
+            "page_count": len(page_info),
+            "pages": page_info
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading PDF info: {str(e)}")
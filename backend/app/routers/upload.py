@@ -2,26 +2,21 @@ from __future__ import annotations
 
 import os
 import shutil
-import tempfile
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from fastapi.responses import Response
 from pydantic import BaseModel
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.schema import Document
-import fitz  # PyMuPDF
-from PIL import Image
-import pytesseract
-from langchain_pinecone import PineconeVectorStore
-
-from ..services.rag import RAGService
-from ..utils.pdf_extract import extract_documents_from_pdf
+
+from ..services.jobs import get_job_queue
 from ..config import settings
+from ..utils.executor import run_blocking
 
 
 router = APIRouter(prefix="", tags=["upload"])
 
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
 
 @router.options("/upload")
 async def upload_options():
@@ -35,69 +30,91 @@ async def upload_options():
     )
 
 
-class UploadResponse(BaseModel):
+class UploadFileStatus(BaseModel):
+    filename: str
+    status: str  # "queued", "running", "completed", "failed"
+    pages_total: int = 0
+    pages_extracted: int = 0
+    pages_failed: int = 0
+    documents_loaded: int = 0
+    chunks_indexed: int = 0
+    chunks_deleted: int = 0
+    unchanged: bool = False
+    error: Optional[str] = None
+
+
+class UploadJobResponse(BaseModel):
+    job_id: str
     namespace: str
+    status: str  # "queued", "running", "completed", "failed"
     files_ingested: int
-    documents_loaded: int
     chunks_indexed: int
+    error: Optional[str] = None
+    files: List[UploadFileStatus] = []
+
+
+def _job_response(job: dict) -> UploadJobResponse:
+    files = [
+        UploadFileStatus(**{k: v for k, v in f.items() if k in UploadFileStatus.model_fields})
+        for f in job["files"]
+    ]
+    return UploadJobResponse(
+        job_id=job["id"],
+        namespace=job["namespace"],
+        status=job["status"],
+        files_ingested=sum(1 for f in files if f.status == "completed"),
+        chunks_indexed=sum(f.chunks_indexed for f in files),
+        error=job["error"],
+        files=files,
+    )
+
 
+def _save_upload(upload: UploadFile, path: str) -> None:
+    # Copy from the spooled upload in fixed-size chunks so large drawings never sit in memory whole
+    upload.file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(upload.file, out, UPLOAD_CHUNK_BYTES)
 
-@router.post("/upload", response_model=UploadResponse)
+
+@router.post("/upload", response_model=UploadJobResponse, status_code=202)
 async def upload_pdfs(
     files: List[UploadFile] = File(...),
     namespace: Optional[str] = Form(None),
 ):
+    """
+    Save the uploaded PDFs and queue them for background ingestion.
+
+    Returns immediately with a job id; poll /upload/jobs/{job_id} for progress.
+    """
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded")
 
+    pdfs = [(os.path.basename(f.filename), f) for f in files if f.filename.lower().endswith(".pdf")]
+    if not pdfs:
+        raise HTTPException(status_code=400, detail="No PDF files uploaded")
+    # Files are stored and indexed by name, so two with the same name would overwrite each other
+    names = [filename for filename, _ in pdfs]
+    duplicates = sorted({filename for filename in names if names.count(filename) > 1})
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate file names in upload: {', '.join(duplicates)}")
+
     target_namespace = namespace or settings.pinecone_namespace
+    job_queue = get_job_queue()
+    job_id, job_dir = job_queue.new_job()
+
+    saved: List[Tuple[str, str]] = []
+    for filename, f in pdfs:
+        path = os.path.join(job_dir, filename)
+        await run_blocking(_save_upload, f, path)
+        saved.append((filename, path))
+
+    await run_blocking(job_queue.enqueue, job_id, target_namespace, job_dir, saved)
+    return _job_response(job_queue.status(job_id))
 
-    tmp_dir = tempfile.mkdtemp(prefix="ingest_")
-    try:
-        saved_paths: List[str] = []
-        for f in files:
-            if not f.filename.lower().endswith(".pdf"):
-                continue
-            tmp_path = os.path.join(tmp_dir, f.filename)
-            with open(tmp_path, "wb") as out:
-                content = await f.read()
-                out.write(content)
-            saved_paths.append(tmp_path)
-
-        if not saved_paths:
-            raise HTTPException(status_code=400, detail="No PDF files uploaded")
-
-        rag = RAGService()
-
-        total_docs = 0
-        all_chunks = []
-        for path in saved_paths:
-            docs = extract_documents_from_pdf(path, ocr_fallback=True, ocr_dpi=300)
-            for d in docs:
-                d.metadata = {**(d.metadata or {}), "path": path, "source": os.path.basename(path)}
-            total_docs += len(docs)
-            chunks = rag.split_documents(docs)
-            all_chunks.extend(chunks)
-
-        if not all_chunks:
-            raise HTTPException(status_code=400, detail="No content extracted from PDFs")
-
-        vectorstore = rag.vectorstore
-        if target_namespace != settings.pinecone_namespace:
-            vectorstore = PineconeVectorStore(
-                index_name=settings.pinecone_index_name,
-                embedding=rag.embeddings,
-                namespace=target_namespace,
-            )
-
-        vectorstore.add_documents(all_chunks)
-
-        return UploadResponse(
-            namespace=target_namespace,
-            files_ingested=len(saved_paths),
-            documents_loaded=total_docs,
-            chunks_indexed=len(all_chunks),
-        )
-    finally:
-        shutil.rmtree(tmp_dir, ignore_errors=True)
 
+@router.get("/upload/jobs/{job_id}", response_model=UploadJobResponse)
+async def get_upload_job(job_id: str):
+    job = await run_blocking(get_job_queue().status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
@@ -0,0 +1,263 @@
+"""
+Semantic cache of /chat answers (SQLite), invalidated when cited drawings are re-ingested
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+
+from .embedding_cache import normalize_text
+from ..config import settings
+from ..utils.metrics import cache_result
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    chunks_key TEXT NOT NULL,
+    query TEXT NOT NULL,
+    query_vector BLOB,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_lookup ON answers (namespace, chunks_key, model);
+CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used);
+CREATE TABLE IF NOT EXISTS answer_sources (
+    key TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (key, source)
+);
+CREATE INDEX IF NOT EXISTS answer_sources_source ON answer_sources (namespace, source);
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a question, without trailing punctuation."""
+    return normalize_text(query).lower().rstrip("?!. ")
+
+
+def chunk_ids_for(docs: List[Document]) -> List[str]:
+    ids: List[str] = []
+    for d in docs:
+        metadata = d.metadata or {}
+        chunk_id = metadata.get("chunk_id")
+        if not chunk_id:
+            # Chunks indexed before ids were assigned: derive one from their content
+            parts = f"{metadata.get('source', '')}|{metadata.get('page', '')}|{d.page_content}"
+            chunk_id = hashlib.sha256(parts.encode("utf-8")).hexdigest()[:32]
+        ids.append(chunk_id)
+    return ids
+
+
+def history_key(conversation_history: Optional[List[Dict[str, str]]]) -> str:
+    """Hash of a conversation's messages; empty for a question asked without history."""
+    if not conversation_history:
+        return ""
+    parts = "\n".join(
+        f"{message.get('role', '')}|{normalize_text(message.get('content', ''))}" for message in conversation_history
+    )
+    return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """Answers keyed by namespace, retrieved chunk ids, conversation history and normalized query.
+
+    A lookup first tries the exact key. Failing that, it compares the query
+    embedding against earlier questions that retrieved the same chunks in the
+    same namespace, after the same history, and reuses an answer whose cosine similarity is at least
+    ``similarity_threshold``. Every entry records the drawings it cites, so
+    :meth:`invalidate_sources` drops it as soon as one of them is re-ingested,
+    even from another process.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 10_000,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 0,
+    ) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    @staticmethod
+    def chunks_key(chunk_ids: Iterable[str], history: str = "") -> str:
+        """Scope of a cached answer: its evidence plus, for follow-ups, the
+        conversation (:func:`history_key`) that gives the question its meaning."""
+        parts = "|".join(sorted(set(chunk_ids)))
+        if history:
+            parts = f"{parts}#{history}"
+        return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_key(model: str, namespace: str, chunks_key: str, query: str) -> str:
+        parts = f"{model}|{namespace}|{chunks_key}|{normalize_query(query)}"
+        return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - created_at > self.ttl_seconds
+
+    def get(
+        self,
+        model: str,
+        namespace: str,
+        chunk_ids: List[str],
+        query: str,
+        query_vector: Optional[List[float]] = None,
+        history: str = "",
+    ) -> Optional[Dict[str, Any]]:
+        """Cached payload for this question, evidence and conversation, or None."""
+        chunks_key = self.chunks_key(chunk_ids, history)
+        key = self.make_key(model, namespace, chunks_key, query)
+        with self._lock:
+            row = self._conn.execute("SELECT payload, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is not None and not self._expired(row[1]):
+                self.hits += 1
+                cache_result("answer", "hit")
+                return self._touch(key, row[0])
+
+            if query_vector is not None and self.similarity_threshold < 1:
+                rows = self._conn.execute(
+                    "SELECT key, query_vector, payload, created_at FROM answers "
+                    "WHERE namespace = ? AND chunks_key = ? AND model = ? AND query_vector IS NOT NULL",
+                    (namespace, chunks_key, model),
+                ).fetchall()
+                rows = [r for r in rows if not self._expired(r[3])]
+                if rows:
+                    target = np.asarray(query_vector, dtype=np.float32)
+                    matrix = np.stack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+                    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(target) or 1.0)
+                    similarities = matrix @ target / np.where(norms == 0, 1.0, norms)
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.similarity_threshold:
+                        self.near_hits += 1
+                        cache_result("answer", "near_hit")
+                        return self._touch(rows[best][0], rows[best][2])
+
+            self.misses += 1
+            cache_result("answer", "miss")
+            return None
+
+    def _touch(self, key: str, payload: str) -> Dict[str, Any]:
+        self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time_ns(), key))
+        self._conn.commit()
+        return json.loads(payload)
+
+    def put(
+        self,
+        model: str,
+        namespace: str,
+        chunk_ids: List[str],
+        query: str,
+        query_vector: Optional[List[float]],
+        payload: Dict[str, Any],
+        sources: Iterable[str],
+        history: str = "",
+    ) -> None:
+        chunks_key = self.chunks_key(chunk_ids, history)
+        key = self.make_key(model, namespace, chunks_key, query)
+        blob = array("f", query_vector).tobytes() if query_vector is not None else None
+        now = time.time_ns()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, model, namespace, chunks_key, query, query_vector, payload, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, namespace, chunks_key, normalize_query(query), blob, json.dumps(payload, default=str), time.time(), now),
+            )
+            self._conn.execute("DELETE FROM answer_sources WHERE key = ?", (key,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO answer_sources (key, namespace, source) VALUES (?, ?, ?)",
+                [(key, namespace, source) for source in set(sources) if source],
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                evicted = [
+                    r[0] for r in self._conn.execute(
+                        "SELECT key FROM answers ORDER BY last_used LIMIT ?", (overflow,)
+                    ).fetchall()
+                ]
+                self._delete_locked(evicted)
+            self._conn.commit()
+
+    def _delete_locked(self, keys: List[str]) -> None:
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM answers WHERE key IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM answer_sources WHERE key IN ({placeholders})", batch)
+
+    def invalidate_sources(self, namespace: str, sources: Iterable[str]) -> int:
+        """Drop every cached answer in ``namespace`` that cites one of ``sources``."""
+        sources = list(set(sources))
+        if not sources:
+            return 0
+        with self._lock:
+            placeholders = ",".join("?" * len(sources))
+            keys = [
+                r[0] for r in self._conn.execute(
+                    f"SELECT DISTINCT key FROM answer_sources WHERE namespace = ? AND source IN ({placeholders})",
+                    (namespace, *sources),
+                ).fetchall()
+            ]
+            self._delete_locked(keys)
+            self._conn.commit()
+        return len(keys)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+        }
+
+
+_shared_cache: Optional[AnswerCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Process-wide answer cache, or None when ``ANSWER_CACHE_ENABLED`` is off."""
+    global _shared_cache
+    if not settings.answer_cache_enabled:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = AnswerCache(
+                settings.answer_cache_path,
+                max_entries=settings.answer_cache_max_entries,
+                similarity_threshold=settings.answer_cache_similarity,
+                ttl_seconds=settings.answer_cache_ttl_seconds,
+            )
+        return _shared_cache
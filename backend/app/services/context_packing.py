@@ -0,0 +1,208 @@
+"""
+Token-budgeted packing of retrieved chunks and conversation history into the chat prompt
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+
+from ..config import settings
+from ..utils.tokens import count_tokens
+
+
+# Context windows (tokens) by model name prefix; longest prefix wins
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4.1": 1_047_576,
+    "gpt-4-32k": 32_768,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+    "o1": 200_000,
+    "o3": 200_000,
+}
+DEFAULT_CONTEXT_WINDOW = 8_192
+
+# Chat format overhead: tokens per message plus the reply primer
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMER_TOKENS = 3
+
+MIN_OVERLAP_CHARS = 8
+MAX_OVERLAP_CHARS = 200
+
+
+@lru_cache(maxsize=64)
+def _fixed_tokens(text: str, model: str) -> int:
+    """Token count for strings that repeat across requests, like the system prompt."""
+    return count_tokens(text, model)
+
+
+def context_window(model: str) -> int:
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+def prompt_token_budget(model: str) -> int:
+    """Prompt tokens allowed for ``model``: its window minus the answer
+    reserve, capped by ``PROMPT_TOKEN_BUDGET`` when that is set."""
+    budget = context_window(model) - settings.answer_token_reserve
+    if settings.prompt_token_budget:
+        budget = min(budget, settings.prompt_token_budget)
+    return budget
+
+
+def _parse_bbox(value: Any) -> Optional[Tuple[float, float, float, float]]:
+    if not isinstance(value, str):
+        return None
+    try:
+        x0, y0, x1, y1 = (float(v) for v in value.split(","))
+    except ValueError:
+        return None
+    return x0, y0, x1, y1
+
+
+def _neighbors(a: Tuple[float, ...], b: Tuple[float, ...], gap: float) -> bool:
+    """True when two boxes overlap or are within ``gap`` points of each other."""
+    return a[0] - gap <= b[2] and b[0] - gap <= a[2] and a[1] - gap <= b[3] and b[1] - gap <= a[3]
+
+
+def _overlap(head: str, tail: str) -> int:
+    """Length of the longest suffix of ``head`` that is also a prefix of ``tail``."""
+    for n in range(min(len(head), len(tail), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if head.endswith(tail[:n]):
+            return n
+    return 0
+
+
+def join_text(a: str, b: str) -> str:
+    """Concatenate two chunk texts, dropping the splitter's shared overlap."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    n = _overlap(a, b)
+    if n:
+        return a + b[n:]
+    n = _overlap(b, a)
+    if n:
+        return b + a[n:]
+    return f"{a}\n{b}"
+
+
+@dataclass
+class ContextBlock:
+    source: str
+    page: Any
+    bbox: Optional[Tuple[float, float, float, float]]
+    text: str
+    rank: int  # best retrieval rank among the merged chunks
+
+    def header(self) -> str:
+        page_info = f" (page {int(self.page)})" if self.page not in ("", None) else ""
+        return f"[From {self.source}{page_info}]:"
+
+    def render(self) -> str:
+        return f"{self.header()}\n{self.text}"
+
+
+def merge_chunks(docs: Sequence[Document], gap: Optional[float] = None) -> List[ContextBlock]:
+    """Collapse duplicate, overlapping and adjacent chunks into blocks.
+
+    Chunks from the same page whose bboxes overlap or lie within ``gap``
+    points are merged into one block with the union bbox, joined in reading
+    order with any overlap shared by consecutive splits removed. Blocks
+    keep the best (lowest) rank of their members and come back in rank
+    order.
+    """
+    gap = settings.context_merge_gap if gap is None else gap
+    blocks: List[ContextBlock] = []
+    for rank, doc in enumerate(docs):
+        metadata = doc.metadata or {}
+        text = doc.page_content.strip()
+        if not text:
+            continue
+        source = metadata.get("source", "unknown")
+        page = metadata.get("page", "")
+        bbox = _parse_bbox(metadata.get("bbox"))
+        target = None
+        for block in blocks:
+            if block.source != source or block.page != page:
+                continue
+            if text in block.text or (
+                bbox is not None and block.bbox is not None and _neighbors(block.bbox, bbox, gap)
+            ):
+                target = block
+                break
+        if target is None:
+            blocks.append(ContextBlock(source, page, bbox, text, rank))
+            continue
+        if bbox is not None and target.bbox is not None and (bbox[1], bbox[0]) < (target.bbox[1], target.bbox[0]):
+            target.text = join_text(text, target.text)
+        else:
+            target.text = join_text(target.text, text)
+        if bbox is not None and target.bbox is not None:
+            target.bbox = (
+                min(target.bbox[0], bbox[0]),
+                min(target.bbox[1], bbox[1]),
+                max(target.bbox[2], bbox[2]),
+                max(target.bbox[3], bbox[3]),
+            )
+    return sorted(blocks, key=lambda b: b.rank)
+
+
+def pack_prompt(
+    system_prompt: str,
+    query: str,
+    docs: Sequence[Document],
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    model: Optional[str] = None,
+    budget: Optional[int] = None,
+) -> List[Tuple[str, str]]:
+    """Build chat messages that fit the model's prompt budget.
+
+    The system prompt and question are always included. Context blocks are
+    added in retrieval order, skipping any that no longer fit, and whatever
+    budget remains goes to conversation history, newest message first.
+    """
+    model = model or settings.openai_model
+    budget = prompt_token_budget(model) if budget is None else budget
+
+    def tokens(text: str) -> int:
+        return count_tokens(text, model)
+
+    question = f"\n\nQuestion: {query}"
+    used = (
+        _fixed_tokens(system_prompt, model)
+        + _fixed_tokens("Context from drawings:\n", model)
+        + tokens(question)
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+        + REPLY_PRIMER_TOKENS
+    )
+
+    context_parts: List[str] = []
+    for block in merge_chunks(docs):
+        rendered = block.render()
+        cost = tokens(rendered) + (2 if context_parts else 0)  # "\n\n" separator
+        if used + cost > budget:
+            continue
+        context_parts.append(rendered)
+        used += cost
+
+    history: List[Tuple[str, str]] = []
+    for msg in reversed(conversation_history or []):
+        cost = tokens(msg["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if used + cost > budget:
+            break
+        history.append((msg["role"], msg["content"]))
+        used += cost
+    history.reverse()
+
+    context = "\n\n".join(context_parts)
+    return [
+        ("system", system_prompt),
+        *history,
+        ("user", f"Context from drawings:\n{context}{question}"),
+    ]
@@ -0,0 +1,233 @@
+"""
+Background ingestion jobs for /upload, persisted in a local SQLite store
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..config import settings
+from ..ingest.ingest import index_pdfs
+from ..utils.pdf_extract import count_pdf_pages
+from .registry import get_rag_service
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    status TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    pages_total INTEGER NOT NULL DEFAULT 0,
+    pages_extracted INTEGER NOT NULL DEFAULT 0,
+    pages_failed INTEGER NOT NULL DEFAULT 0,
+    documents_loaded INTEGER NOT NULL DEFAULT 0,
+    chunks_indexed INTEGER NOT NULL DEFAULT 0,
+    chunks_deleted INTEGER NOT NULL DEFAULT 0,
+    unchanged INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+
+class IngestJobStore:
+    """SQLite persistence for jobs and their per-file progress."""
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            try:
+                yield conn
+                conn.commit()
+            finally:
+                conn.close()
+
+    def create(self, job_id: str, namespace: str, directory: str, files: List[Tuple[str, str]]) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, namespace, status, directory, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, namespace, directory, now, now),
+            )
+            conn.executemany(
+                "INSERT INTO job_files (job_id, position, filename, path, status) VALUES (?, ?, ?, ?, 'queued')",
+                [(job_id, i, filename, path) for i, (filename, path) in enumerate(files)],
+            )
+
+    def set_job(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def update_file(self, job_id: str, position: int, **fields: Any) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE job_files SET {columns} WHERE job_id = ? AND position = ?",
+                (*fields.values(), job_id, position),
+            )
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def increment_file(self, job_id: str, position: int, column: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE job_files SET {column} = {column} + 1 WHERE job_id = ? AND position = ?",
+                (job_id, position),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            files = conn.execute(
+                "SELECT * FROM job_files WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        return {**dict(job), "files": [dict(f) for f in files]}
+
+    def unfinished(self) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+
+class IngestJobQueue:
+    """Bounded local worker pool that runs ingestion jobs from the job store.
+
+    Jobs left ``queued`` or ``running`` by a previous process are picked up
+    again by :meth:`resume`. Re-running a half-finished file is cheap because
+    ``index_pdfs`` skips pages and chunks already recorded in the manifest.
+    """
+
+    def __init__(self, store: IngestJobStore, workers: int) -> None:
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-job")
+
+    def new_job(self) -> Tuple[str, str]:
+        """Allocate a job id and the directory its uploads should be saved to."""
+        job_id = uuid.uuid4().hex
+        directory = os.path.join(settings.upload_dir, job_id)
+        os.makedirs(directory, exist_ok=True)
+        return job_id, directory
+
+    def enqueue(self, job_id: str, namespace: str, directory: str, files: List[Tuple[str, str]]) -> None:
+        self.store.create(job_id, namespace, directory, files)
+        self._executor.submit(self._run, job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def resume(self) -> int:
+        job_ids = self.store.unfinished()
+        for job_id in job_ids:
+            self._executor.submit(self._run, job_id)
+        return len(job_ids)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        self.store.set_job(job_id, "running")
+        try:
+            rag = get_rag_service()
+            vectorstore = rag.vectorstore_for(job["namespace"])
+            for file in job["files"]:
+                if file["status"] in ("completed", "failed"):
+                    continue
+                self._run_file(job_id, job["namespace"], file, rag, vectorstore)
+        except Exception as e:
+            self.store.set_job(job_id, "failed", error=str(e))
+            return
+
+        files = self.store.get(job_id)["files"]
+        if all(f["status"] == "failed" for f in files):
+            self.store.set_job(job_id, "failed", error="No files could be ingested")
+        else:
+            self.store.set_job(job_id, "completed")
+        shutil.rmtree(job["directory"], ignore_errors=True)
+
+    def _run_file(self, job_id: str, namespace: str, file: Dict[str, Any], rag: Any, vectorstore: Any) -> None:
+        position = file["position"]
+        try:
+            pages_total = count_pdf_pages(file["path"])
+        except Exception as e:
+            self.store.update_file(job_id, position, status="failed", error=str(e))
+            return
+        self.store.update_file(
+            job_id, position, status="running", pages_total=pages_total, pages_extracted=0, pages_failed=0, error=None
+        )
+
+        def on_page(path: str, page_index: int, error: Optional[str]) -> None:
+            self.store.increment_file(job_id, position, "pages_failed" if error else "pages_extracted")
+
+        try:
+            stats = index_pdfs(
+                rag, vectorstore, [file["path"]], namespace, workers=settings.ingest_job_extract_workers, on_page=on_page
+            )
+        except Exception as e:
+            self.store.update_file(job_id, position, status="failed", error=str(e))
+            return
+
+        error = None
+        if not stats.chunks_total:
+            error = "No content extracted from PDF"
+        elif stats.pages_failed:
+            error = f"{stats.pages_failed} pages failed extraction"
+        self.store.update_file(
+            job_id,
+            position,
+            status="completed" if stats.chunks_total else "failed",
+            documents_loaded=stats.documents,
+            chunks_indexed=stats.chunks_indexed,
+            chunks_deleted=stats.chunks_deleted,
+            unchanged=int(stats.files_unchanged > 0),
+            error=error,
+        )
+
+
+_job_queue: Optional[IngestJobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> IngestJobQueue:
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = IngestJobQueue(IngestJobStore(settings.jobs_db_path), settings.ingest_job_workers)
+        return _job_queue
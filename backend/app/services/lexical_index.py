@@ -0,0 +1,223 @@
+"""
+BM25 inverted index over ingested chunks (SQLite), fused with vector search
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+
+from .local_index import matches_filter
+from ..config import settings
+
+
+# Keeps sheet numbers ("a4.21"), member sizes ("w12x26") and fractions ("1/2") whole
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+PART_SPLIT_RE = re.compile(r"[.\-/]")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was were what which with".split()
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    UNIQUE (namespace, chunk_id)
+);
+CREATE INDEX IF NOT EXISTS docs_source ON docs (namespace, source);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term_id, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound tokens also index their parts ("a4.21" -> "a4", "21")."""
+    tokens: List[str] = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        parts = PART_SPLIT_RE.split(token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p and p not in STOPWORDS)
+    return tokens
+
+
+class LexicalIndex:
+    """Okapi BM25 over chunk text, one SQLite file for every namespace.
+
+    Terms are interned in ``terms`` and postings are stored as
+    ``(term_id, doc_id, tf)`` rows in a clustered ``WITHOUT ROWID`` table, so
+    a term lookup is a single range scan. Chunks are added and deleted by id
+    alongside the vector upserts, which keeps per-file re-ingestion
+    incremental.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _term_ids(self, terms: Sequence[str], create: bool) -> Dict[str, int]:
+        ids: Dict[str, int] = {}
+        unique = list(dict.fromkeys(terms))
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            if create:
+                self._conn.executemany("INSERT OR IGNORE INTO terms (term) VALUES (?)", [(t,) for t in batch])
+            placeholders = ",".join("?" * len(batch))
+            for term_id, term in self._conn.execute(
+                f"SELECT id, term FROM terms WHERE term IN ({placeholders})", batch
+            ):
+                ids[term] = term_id
+        return ids
+
+    def _delete_locked(self, namespace: str, chunk_ids: Sequence[str]) -> None:
+        for start in range(0, len(chunk_ids), 500):
+            batch = list(chunk_ids[start:start + 500])
+            placeholders = ",".join("?" * len(batch))
+            doc_ids = [
+                (row[0],) for row in self._conn.execute(
+                    f"SELECT id FROM docs WHERE namespace = ? AND chunk_id IN ({placeholders})", (namespace, *batch)
+                )
+            ]
+            self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", doc_ids)
+            self._conn.executemany("DELETE FROM docs WHERE id = ?", doc_ids)
+
+    def add(self, namespace: str, chunk_ids: Sequence[str], docs: Sequence[Document]) -> None:
+        """Index chunks; re-adding an existing chunk id replaces it."""
+        if not chunk_ids:
+            return
+        with self._lock:
+            self._delete_locked(namespace, chunk_ids)
+            for chunk_id, doc in zip(chunk_ids, docs):
+                metadata = doc.metadata or {}
+                counts = Counter(tokenize(doc.page_content))
+                cursor = self._conn.execute(
+                    "INSERT INTO docs (namespace, chunk_id, source, length, text, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        namespace,
+                        chunk_id,
+                        metadata.get("source", ""),
+                        sum(counts.values()),
+                        doc.page_content,
+                        json.dumps(metadata, default=str),
+                    ),
+                )
+                term_ids = self._term_ids(list(counts), create=True)
+                self._conn.executemany(
+                    "INSERT INTO postings (term_id, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term_ids[term], cursor.lastrowid, tf) for term, tf in counts.items()],
+                )
+            self._conn.commit()
+
+    def delete(self, namespace: str, chunk_ids: Sequence[str]) -> None:
+        if not chunk_ids:
+            return
+        with self._lock:
+            self._delete_locked(namespace, chunk_ids)
+            self._conn.commit()
+
+    def search(
+        self, namespace: str, query: str, k: int = 10, flt: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Top-``k`` chunks in ``namespace`` by BM25 score matching the metadata filter ``flt``."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            total, avg_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM docs WHERE namespace = ?", (namespace,)
+            ).fetchone()
+            if not total:
+                return []
+            avg_length = avg_length or 1.0
+            scores: Dict[int, float] = {}
+            for term_id in self._term_ids(terms, create=False).values():
+                postings = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id "
+                    "WHERE p.term_id = ? AND d.namespace = ?",
+                    (term_id, namespace),
+                ).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf, length in postings:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            results: List[Tuple[Document, float]] = []
+            for doc_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                text, metadata = self._conn.execute(
+                    "SELECT text, metadata FROM docs WHERE id = ?", (doc_id,)
+                ).fetchone()
+                metadata = json.loads(metadata)
+                if not matches_filter(metadata, flt):
+                    continue
+                results.append((Document(page_content=text, metadata=metadata), score))
+                if len(results) >= k:
+                    break
+            return results
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Tuple[str, Document]]],
+    k: int = 60,
+) -> List[Tuple[Document, float]]:
+    """Fuse ranked ``(key, document)`` lists by summing ``1 / (k + rank)``.
+
+    The first list a key appears in supplies its document.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, (key, doc) in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [(docs[key], score) for key, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
+
+
+_shared_index: Optional[LexicalIndex] = None
+_shared_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """Process-wide BM25 index, or None when ``HYBRID_SEARCH_ENABLED`` is off."""
+    global _shared_index
+    if not settings.hybrid_search_enabled:
+        return None
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = LexicalIndex(settings.lexical_index_path)
+        return _shared_index
@@ -0,0 +1,480 @@
+"""
+In-process vector index backed by a memory-mapped NumPy matrix
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+DATA_FILE_RE = re.compile(r"(vectors(\.\d+)?\.f32|rows(\.\d+)?\.jsonl)")
+
+
+def matches_filter(metadata: Dict[str, Any], flt: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Pinecone-style metadata filter against one metadata dict.
+
+    Supports ``$eq``, ``$ne``, ``$in``, ``$nin``, ``$gt``, ``$gte``, ``$lt``,
+    ``$lte``, ``$and``, ``$or`` and the ``{"field": value}`` shorthand.
+    """
+    if not flt:
+        return True
+    for key, condition in flt.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            # List-valued metadata matches when any element does, as in Pinecone
+            values = value if isinstance(value, list) else [value]
+            if op == "$eq":
+                ok = expected in values
+            elif op == "$ne":
+                ok = expected not in values
+            elif op == "$in":
+                ok = any(v in expected for v in values)
+            elif op == "$nin":
+                ok = not any(v in expected for v in values)
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                ok = {
+                    "$gt": value > expected,
+                    "$gte": value >= expected,
+                    "$lt": value < expected,
+                    "$lte": value <= expected,
+                }[op]
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            if not ok:
+                return False
+    return True
+
+
+class LocalVectorIndex:
+    """Normalized embedding matrix plus metadata columns for one namespace.
+
+    On disk a namespace directory holds:
+
+    - ``index.json``: dimension and generation
+    - ``vectors.f32``: row-major float32 matrix, memory-mapped on load
+    - ``rows.jsonl``: append-only log of row additions and deletions
+
+    Deleted rows are tombstoned and dropped by :meth:`compact`, which writes
+    the next generation's files (``vectors.<n>.f32``, ``rows.<n>.jsonl``) and
+    switches to them by replacing ``index.json`` last. :meth:`add` appends
+    vectors before rows, and loading trims whichever of the two ran ahead, so
+    a crash mid-write leaves the previous state rather than misaligned rows.
+
+    Search is exact (one matrix-vector product) unless ``mode="ivf"``, in which
+    case an inverted-file coarse quantizer restricts scoring to the ``nprobe``
+    nearest clusters once the index holds at least ``ivf_min_rows`` rows.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        mode: str = "exact",
+        nlist: int = 0,
+        nprobe: int = 8,
+        ivf_min_rows: int = 20_000,
+    ) -> None:
+        self.directory = directory
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self._lock = threading.RLock()
+        self._reset()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _reset(self) -> None:
+        self.dim: Optional[int] = None
+        self.generation = 0
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self._row_by_id: Dict[str, int] = {}
+        self._matrix: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+
+    @property
+    def _header_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def _generation_paths(self, generation: int) -> Tuple[str, str]:
+        suffix = f".{generation}" if generation else ""
+        return (
+            os.path.join(self.directory, f"vectors{suffix}.f32"),
+            os.path.join(self.directory, f"rows{suffix}.jsonl"),
+        )
+
+    @property
+    def _vectors_path(self) -> str:
+        return self._generation_paths(self.generation)[0]
+
+    @property
+    def _rows_path(self) -> str:
+        return self._generation_paths(self.generation)[1]
+
+    def _write_header(self) -> None:
+        tmp_path = self._header_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "generation": self.generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._header_path)
+
+    def __len__(self) -> int:
+        return int(self.alive.sum())
+
+    def _load(self) -> None:
+        if not os.path.exists(self._header_path):
+            return
+        with open(self._header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self.dim = header["dim"]
+        self.generation = header.get("generation", 0)
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        stored = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+
+        alive: List[bool] = []
+        if os.path.exists(self._rows_path):
+            replayed = 0
+            with open(self._rows_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn by a crash mid-append
+                    if not line.strip():
+                        replayed += len(line)
+                        continue
+                    entry = json.loads(line)
+                    if entry["op"] == "add" and len(self.ids) >= stored:
+                        break  # its vector never reached disk
+                    replayed += len(line)
+                    if entry["op"] == "add":
+                        self._row_by_id[entry["id"]] = len(self.ids)
+                        self.ids.append(entry["id"])
+                        self.texts.append(entry["text"])
+                        self.metadatas.append(entry["metadata"])
+                        alive.append(True)
+                    elif entry["op"] == "del":
+                        row = self._row_by_id.pop(entry["id"], None)
+                        if row is not None:
+                            alive[row] = False
+            if replayed < os.path.getsize(self._rows_path):
+                os.truncate(self._rows_path, replayed)
+        # Vectors (or part of one) appended by an add whose rows were never logged
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) > len(self.ids) * row_bytes:
+            os.truncate(self._vectors_path, len(self.ids) * row_bytes)
+        self.alive = np.array(alive, dtype=bool)
+        self._remap()
+
+    def _remap(self) -> None:
+        rows = len(self.ids)
+        if not rows or self.dim is None:
+            self._matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+            return
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def add(self, ids: List[str], vectors: Iterable[Iterable[float]], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        matrix = np.asarray(list(vectors), dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(ids):
+            raise ValueError("ids and vectors must have the same length")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1.0, norms)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+                self._write_header()
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {matrix.shape[1]}")
+
+            # Re-adding an id replaces the previous row
+            self._delete_locked([i for i in ids if i in self._row_by_id])
+
+            with open(self._vectors_path, "ab") as f:
+                f.write(matrix.astype(np.float32).tobytes())
+            with open(self._rows_path, "a", encoding="utf-8") as f:
+                for row_id, text, metadata in zip(ids, texts, metadatas):
+                    f.write(json.dumps({"op": "add", "id": row_id, "text": text, "metadata": metadata}) + "\n")
+
+            first_row = len(self.ids)
+            for offset, row_id in enumerate(ids):
+                self._row_by_id[row_id] = first_row + offset
+            self.ids.extend(ids)
+            self.texts.extend(texts)
+            self.metadatas.extend(metadatas)
+            self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+            self._remap()
+
+            if self._centroids is not None:
+                assigned = np.argmax(matrix @ self._centroids.T, axis=1)
+                self._assignments = np.concatenate([self._assignments, assigned])
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            self._delete_locked(ids)
+
+    def _delete_locked(self, ids: List[str]) -> None:
+        removed = [i for i in ids if i in self._row_by_id]
+        if not removed:
+            return
+        with open(self._rows_path, "a", encoding="utf-8") as f:
+            for row_id in removed:
+                self.alive[self._row_by_id.pop(row_id)] = False
+                f.write(json.dumps({"op": "del", "id": row_id}) + "\n")
+
+    def delete_all(self) -> None:
+        with self._lock:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+            # The header goes first: without it the data files are ignored
+            if os.path.exists(self._header_path):
+                os.remove(self._header_path)
+            self._remove_generations(keep=None)
+            self._reset()
+
+    def _remove_generations(self, keep: Optional[int]) -> None:
+        """Delete the vector and row files of every generation but ``keep``."""
+        kept = set(self._generation_paths(keep)) if keep is not None else set()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path not in kept and DATA_FILE_RE.fullmatch(name):
+                os.remove(path)
+
+    def dead_ratio(self) -> float:
+        """Share of stored rows that are tombstoned."""
+        with self._lock:
+            return 1.0 - len(self) / len(self.ids) if self.ids else 0.0
+
+    def compact_if_needed(self, max_dead_ratio: float) -> bool:
+        """:meth:`compact` once more than ``max_dead_ratio`` of the rows are tombstoned."""
+        with self._lock:
+            if self.dead_ratio() <= max_dead_ratio:
+                return False
+            self.compact()
+            return True
+
+    def compact(self) -> None:
+        """Rewrite the vector file and row log without tombstoned rows."""
+        with self._lock:
+            keep = np.flatnonzero(self.alive)
+            if len(keep) == len(self.ids):
+                return
+            matrix = np.array(self._matrix[keep]) if len(keep) else np.zeros((0, self.dim or 0), dtype=np.float32)
+            ids = [self.ids[i] for i in keep]
+            texts = [self.texts[i] for i in keep]
+            metadatas = [self.metadatas[i] for i in keep]
+
+            # Write the next generation alongside the current one; replacing the
+            # header commits it, so a crash before that leaves the old files in use
+            vectors_path, rows_path = self._generation_paths(self.generation + 1)
+            with open(vectors_path, "wb") as f:
+                f.write(matrix.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(rows_path, "w", encoding="utf-8") as f:
+                for row_id, text, metadata in zip(ids, texts, metadatas):
+                    f.write(json.dumps({"op": "add", "id": row_id, "text": text, "metadata": metadata}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+            self.generation += 1
+            self._write_header()
+            self._remove_generations(keep=self.generation)
+
+            self.ids, self.texts, self.metadatas = ids, texts, metadatas
+            self._row_by_id = {row_id: i for i, row_id in enumerate(ids)}
+            self.alive = np.ones(len(ids), dtype=bool)
+            self._centroids = self._assignments = None
+            self._remap()
+
+    def _train_ivf(self) -> None:
+        """Fit the coarse quantizer with a few rounds of spherical k-means."""
+        rows = np.flatnonzero(self.alive)
+        nlist = self.nlist or max(1, int(np.sqrt(len(rows))))
+        rng = np.random.default_rng(0)
+        sample = rows if len(rows) <= nlist * 64 else rng.choice(rows, nlist * 64, replace=False)
+        data = np.asarray(self._matrix[np.sort(sample)])
+        centroids = data[rng.choice(len(data), nlist, replace=False)]
+        for _ in range(10):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = data[labels == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+        assignments = np.empty(len(self.ids), dtype=np.int64)
+        for start in range(0, len(self.ids), 65_536):
+            block = np.asarray(self._matrix[start:start + 65_536])
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        self._centroids, self._assignments = centroids, assignments
+
+    def search(
+        self,
+        vector: Iterable[float],
+        k: int = 4,
+        flt: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Return ``(document, cosine similarity)`` pairs for the top-``k`` rows.
+
+        Rows are resolved to documents under the lock: a concurrent
+        :meth:`compact` renumbers them.
+        """
+        with self._lock:
+            if not self.ids or self.dim is None:
+                return []
+            query = np.asarray(vector, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+
+            mask = self.alive.copy()
+            if flt:
+                mask &= np.fromiter((matches_filter(m, flt) for m in self.metadatas), dtype=bool, count=len(self.metadatas))
+
+            if self.mode == "ivf" and int(mask.sum()) >= self.ivf_min_rows:
+                if self._centroids is None:
+                    self._train_ivf()
+                probes = np.argsort(-(self._centroids @ query))[: self.nprobe]
+                mask &= np.isin(self._assignments, probes)
+
+            candidates = np.flatnonzero(mask)
+            if not len(candidates):
+                return []
+            scores = np.asarray(self._matrix[candidates]) @ query
+            k = min(k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                (
+                    Document(page_content=self.texts[candidates[i]], metadata=dict(self.metadatas[candidates[i]])),
+                    float(scores[i]),
+                )
+                for i in top
+            ]
+
+
+_indexes: Dict[str, LocalVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(directory: str, **kwargs: Any) -> LocalVectorIndex:
+    """One shared index object per namespace directory within the process."""
+    directory = os.path.abspath(directory)
+    with _indexes_lock:
+        if directory not in _indexes:
+            _indexes[directory] = LocalVectorIndex(directory, **kwargs)
+        return _indexes[directory]
+
+
+class LocalVectorStore(VectorStore):
+    """LangChain vector store over a :class:`LocalVectorIndex` namespace."""
+
+    def __init__(self, index_dir: str, embedding: Embeddings, namespace: str = "default", **index_kwargs: Any) -> None:
+        self._embedding = embedding
+        self._namespace = namespace
+        self._index = get_local_index(os.path.join(index_dir, namespace), **index_kwargs)
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self._index.add(ids, vectors, texts, metadatas)
+        return ids
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        vectors: List[List[float]],
+        metadatas: List[dict],
+        ids: List[str],
+    ) -> List[str]:
+        """Add rows whose vectors were computed by the caller."""
+        self._index.add(ids, vectors, texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: Optional[bool] = None, **kwargs: Any) -> None:
+        if delete_all:
+            self._index.delete_all()
+        elif ids:
+            self._index.delete(ids)
+
+    def compact_if_needed(self, max_dead_ratio: float) -> bool:
+        return self._index.compact_if_needed(max_dead_ratio)
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return self._index.search(embedding, k=k, flt=filter)
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k=k, filter=filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        index_dir: str = "data/vector_index",
+        namespace: str = "default",
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(index_dir, embedding, namespace=namespace, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -1,141 +1,595 @@
 from __future__ import annotations
 
-from typing import List, Tuple, Dict, Any, Optional
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import AsyncIterator, Callable, List, Tuple, Dict, Any, Optional
 
+import httpx
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_pinecone import PineconeVectorStore
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.vectorstores import VectorStore
 from langchain.schema import Document
 
+from .answer_cache import chunk_ids_for, get_answer_cache, history_key
+from .context_packing import pack_prompt
+from .embedding_cache import CachedEmbeddings, get_embedding_cache
+from .lexical_index import get_lexical_index, reciprocal_rank_fusion
+from .reranker import Reranker
+from .sheet_facts import get_sheet_facts
+from .vectorstores import create_vectorstore
 from ..config import settings
 from ..utils.construction_validation import construction_validator
+from ..utils.layout_chunker import LayoutChunker
+from ..utils.metrics import observe_stage, record_tokens, stage
+from ..utils.tokens import count_tokens
+from ..utils.sheets import build_metadata_filter, detect_sheet_numbers
+
+
+SYSTEM_PROMPT = (
+    "You are an expert construction and architectural assistant specialized in analyzing technical drawings, blueprints, and construction documents. "
+    
+    "CRITICAL REQUIREMENTS:\n"
+    "- ALWAYS specify which drawing/plan number you're referencing (e.g., 'According to drawing A3.2 - First Floor Plan...')\n"
+    "- When multiple drawings contain similar information, compare and distinguish between them clearly\n"
+    "- For ambiguous questions, ask for clarification (e.g., 'Which floor plan - A3.1 Ground Floor or A3.2 First Floor?')\n"
+    "- For complex multi-drawing queries, synthesize information across drawings and cite each source\n"
+    "- Keep original units and scales exactly as shown\n"
+    "- If uncertain, explain what additional information would help verify\n"
+    "- KEEP RESPONSES CONCISE: Aim for 1-3 sentences unless detailed analysis is specifically requested\n"
+    
+    "EXPERTISE AREAS:\n"
+    "- Construction details, materials, dimensions, codes, specifications\n"
+    "- Building systems (structural, MEP, fire safety)\n"
+    "- Code compliance and building regulations\n"
+    "- Construction sequencing and coordination\n"
+    
+    "RESPONSE FORMAT:\n"
+    "- Lead with the direct answer and drawing reference\n"
+    "- Provide precise measurements with units\n"
+    "- Note any discrepancies between drawings\n"
+    "- Suggest verification methods when uncertain\n"
+    "- Be conversational and concise - avoid lengthy explanations unless asked"
+)
+
+
+@dataclass
+class Retrieval:
+    """Chunks retrieved for one query, with the query embedding and raw scores.
+
+    ``scores[i]`` holds the scores that found ``docs[i]``: ``vector``
+    (similarity from the vector store), ``lexical`` (BM25) and ``fused``
+    (reciprocal rank, hybrid search only).
+    """
+
+    query: str
+    vector: List[float]
+    docs: List[Document] = field(default_factory=list)
+    scores: List[Dict[str, float]] = field(default_factory=list)
 
 
 class RAGService:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        http_client: Optional[httpx.Client] = None,
+        http_async_client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
         self.embeddings = OpenAIEmbeddings(
             api_key=settings.openai_api_key,
             model=settings.openai_embedding_model,
+            http_client=http_client,
+            http_async_client=http_async_client,
         )
+        if settings.embedding_cache_enabled:
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                get_embedding_cache(settings.embedding_cache_path, settings.embedding_cache_max_entries),
+                model=settings.openai_embedding_model,
+                dimensions=settings.openai_embedding_dim,
+            )
         self.llm = ChatOpenAI(
             api_key=settings.openai_api_key,
             model=settings.openai_model,
             temperature=settings.openai_temperature,
+            http_client=http_client,
+            http_async_client=http_async_client,
         )
 
-        # Vector store will connect to existing Pinecone index
-        self.vectorstore = PineconeVectorStore(
-            index_name=settings.pinecone_index_name,
-            embedding=self.embeddings,
-            namespace=settings.pinecone_namespace,
-            pinecone_api_key=settings.pinecone_api_key,
+        # Vector store connects to the configured backend (Pinecone or local)
+        self.vectorstore = create_vectorstore(self.embeddings, settings.pinecone_namespace)
+        self._vectorstores: "OrderedDict[str, VectorStore]" = OrderedDict()
+        self._vectorstores_lock = threading.Lock()
+        self.answer_cache = get_answer_cache()
+        self.lexical_index = get_lexical_index()
+        self.sheet_facts = get_sheet_facts()
+        self.reranker = (
+            Reranker(sheet_boost=settings.rerank_sheet_boost, min_score_ratio=settings.rerank_min_score_ratio)
+            if settings.rerank_enabled
+            else None
         )
 
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50,
-            separators=["\n\n", "\n", ". ", ".", " "]
+        self.chunker = LayoutChunker(
+            chunk_size=settings.chunk_size,
+            chunk_overlap=settings.chunk_overlap,
+            gap_x=settings.layout_gap_x,
+            gap_y=settings.layout_gap_y,
+            min_chunk_chars=settings.layout_min_chunk_chars,
         )
 
-    def split_documents(self, docs: List[Document]) -> List[Document]:
-        return self.splitter.split_documents(docs)
+    def split_documents(
+        self, docs: List[Document], skip_block: Optional[Callable[[Document], bool]] = None
+    ) -> List[Document]:
+        chunks = self.chunker.split_documents(docs, skip_block=skip_block)
+        # N.T.S. markings, scales and dimensions are read from metadata at query time
+        return [construction_validator.annotate(chunk) for chunk in chunks]
 
-    def answer_query(
-        self, 
-        query: str, 
-        top_k: int = 6, 
-        namespace: Optional[str] = None,
-        conversation_history: Optional[List[Dict[str, str]]] = None
-    ) -> Tuple[str, List[Dict[str, Any]]]:
-        vectorstore = self.vectorstore
-        if namespace is not None and namespace != settings.pinecone_namespace:
-            vectorstore = PineconeVectorStore(
-                index_name=settings.pinecone_index_name,
-                embedding=self.embeddings,
-                namespace=namespace,
-                pinecone_api_key=settings.pinecone_api_key,
-            )
+    def vectorstore_for(self, namespace: Optional[str] = None) -> VectorStore:
+        """Vector store bound to ``namespace``, reused across calls.
 
-        retriever = vectorstore.as_retriever(search_kwargs={"k": top_k})
-        docs = retriever.get_relevant_documents(query)
-
-        # Build context with source attribution
-        context_parts = []
-        for d in docs:
-            source = d.metadata.get("source", "unknown")
-            page = d.metadata.get("page", "")
-            page_info = f" (page {int(page)})" if page != "" else ""
-            context_parts.append(f"[From {source}{page_info}]:\n{d.page_content}")
-        
-        context = "\n\n".join(context_parts)
-
-        system_prompt = (
-            "You are an expert construction and architectural assistant specialized in analyzing technical drawings, blueprints, and construction documents. "
-            
-            "CRITICAL REQUIREMENTS:\n"
-            "- ALWAYS specify which drawing/plan number you're referencing (e.g., 'According to drawing A3.2 - First Floor Plan...')\n"
-            "- When multiple drawings contain similar information, compare and distinguish between them clearly\n"
-            "- For ambiguous questions, ask for clarification (e.g., 'Which floor plan - A3.1 Ground Floor or A3.2 First Floor?')\n"
-            "- For complex multi-drawing queries, synthesize information across drawings and cite each source\n"
-            "- Keep original units and scales exactly as shown\n"
-            "- If uncertain, explain what additional information would help verify\n"
-            "- KEEP RESPONSES CONCISE: Aim for 1-3 sentences unless detailed analysis is specifically requested\n"
-            
-            "EXPERTISE AREAS:\n"
-            "- Construction details, materials, dimensions, codes, specifications\n"
-            "- Building systems (structural, MEP, fire safety)\n"
-            "- Code compliance and building regulations\n"
-            "- Construction sequencing and coordination\n"
-            
-            "RESPONSE FORMAT:\n"
-            "- Lead with the direct answer and drawing reference\n"
-            "- Provide precise measurements with units\n"
-            "- Note any discrepancies between drawings\n"
-            "- Suggest verification methods when uncertain\n"
-            "- Be conversational and concise - avoid lengthy explanations unless asked"
-        )
+        Non-default namespaces are kept in a small LRU so repeated queries
+        against the same namespace don't rebuild the store.
+        """
+        if namespace is None or namespace == settings.pinecone_namespace:
+            return self.vectorstore
+        with self._vectorstores_lock:
+            vectorstore = self._vectorstores.get(namespace)
+            if vectorstore is not None:
+                self._vectorstores.move_to_end(namespace)
+                return vectorstore
+            vectorstore = create_vectorstore(self.embeddings, namespace)
+            self._vectorstores[namespace] = vectorstore
+            while len(self._vectorstores) > settings.vectorstore_cache_size:
+                self._vectorstores.popitem(last=False)
+            return vectorstore
 
-        # Build conversation with history
-        messages = [("system", system_prompt)]
-        
-        # Add conversation history (token-based limit ~8k tokens for context)
-        if conversation_history:
-            # Rough token estimation: ~4 chars per token
-            token_budget = 8000
-            current_tokens = len(system_prompt) // 4 + len(context) // 4 + len(query) // 4
-            
-            # Add history from newest to oldest until we hit token limit
-            history_to_include = []
-            for msg in reversed(conversation_history):
-                msg_tokens = len(msg["content"]) // 4
-                if current_tokens + msg_tokens > token_budget:
-                    break
-                history_to_include.insert(0, msg)
-                current_tokens += msg_tokens
-            
-            for msg in history_to_include:
-                messages.append((msg["role"], msg["content"]))
-        
-        # Add current query with context
-        messages.append(("user", f"Context from drawings:\n{context}\n\nQuestion: {query}"))
-
-        response = self.llm.invoke(messages)
-        answer = response.content if hasattr(response, "content") else str(response)
+    def _build_messages(
+        self,
+        query: str,
+        docs: List[Document],
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+    ) -> List[Tuple[str, str]]:
+        # Context and history are packed to the model's token budget
+        with stage("chat.pack"):
+            return pack_prompt(SYSTEM_PROMPT, query, docs, conversation_history, model=settings.openai_model)
 
+    @staticmethod
+    def _record_usage(messages: List[Tuple[str, str]], answer: str, usage: Optional[Dict[str, Any]]) -> None:
+        """Count LLM tokens from the response's usage, or estimate them when it has none."""
+        if usage:
+            record_tokens("prompt", usage.get("input_tokens", 0))
+            record_tokens("completion", usage.get("output_tokens", 0))
+            return
+        record_tokens("prompt", sum(count_tokens(content, settings.openai_model) for _, content in messages))
+        record_tokens("completion", count_tokens(answer, settings.openai_model))
+
+    @staticmethod
+    def _build_sources(docs: List[Document], scores: Optional[List[Dict[str, float]]] = None) -> List[Dict[str, Any]]:
+        """Sources for the response; ``score`` is the chunk's vector similarity to
+        the query, None for chunks only BM25 found."""
         sources: List[Dict[str, Any]] = []
-        for d in docs:
+        for i, d in enumerate(docs):
             metadata = d.metadata or {}
+            raw = scores[i] if scores else {}
             sources.append({
                 "id": metadata.get("id") or metadata.get("source") or metadata.get("path", "unknown"),
-                "score": metadata.get("_distance", 0.0) or metadata.get("score", 0.0),
+                "score": raw.get("vector"),
+                "scores": raw,
                 "metadata": metadata,
                 "text_content": d.page_content,  # Include the actual text content
             })
+        return sources
+
+    def _fetch_k(self, top_k: int) -> int:
+        """Candidates to retrieve so the reranker has more than ``top_k`` to choose from."""
+        return max(top_k, settings.rerank_fetch_k) if self.reranker is not None else top_k
+
+    def _rerank(self, retrieval: Retrieval, top_k: int) -> Retrieval:
+        """The best ``top_k`` or fewer candidates within ``RERANK_TOKEN_BUDGET``."""
+        if self.reranker is None:
+            return retrieval
+        with stage("chat.rerank"):
+            hits = self.reranker.select(
+                retrieval.query,
+                list(zip(retrieval.docs, retrieval.scores)),
+                top_k,
+                token_budget=settings.rerank_token_budget,
+                model=settings.openai_model,
+            )
+        return self._retrieval(retrieval.query, retrieval.vector, hits)
+
+    def _page_facts(
+        self, namespace: Optional[str], sources: List[Dict[str, Any]]
+    ) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        """Ingest-time measurement facts for every page the sources cite."""
+        keys = []
+        for source in sources:
+            metadata = source.get("metadata") or {}
+            if metadata.get("source") and metadata.get("page") is not None:
+                keys.append((metadata["source"], metadata["page"]))
+        return self.sheet_facts.lookup(namespace or settings.pinecone_namespace, keys)
+
+    def _cached_answer(
+        self,
+        query: str,
+        namespace: Optional[str],
+        docs: List[Document],
+        vector: List[float],
+        conversation_history: Optional[List[Dict[str, str]]],
+    ) -> Optional[Dict[str, Any]]:
+        if self.answer_cache is None or not docs:
+            return None
+        with stage("chat.cache"):
+            return self.answer_cache.get(
+                settings.openai_model,
+                namespace or settings.pinecone_namespace,
+                chunk_ids_for(docs),
+                query,
+                vector,
+                history=history_key(conversation_history),
+            )
+
+    def _store_answer(
+        self,
+        query: str,
+        namespace: Optional[str],
+        docs: List[Document],
+        vector: List[float],
+        conversation_history: Optional[List[Dict[str, str]]],
+        answer: str,
+        sources: List[Dict[str, Any]],
+        confidence_override: Optional[str],
+    ) -> None:
+        if self.answer_cache is None or not docs:
+            return
+        self.answer_cache.put(
+            settings.openai_model,
+            namespace or settings.pinecone_namespace,
+            chunk_ids_for(docs),
+            query,
+            vector,
+            {"answer": answer, "sources": sources, "confidence_override": confidence_override},
+            sources=[(d.metadata or {}).get("source", "") for d in docs],
+            history=history_key(conversation_history),
+        )
+
+    def answer_query(
+        self, 
+        query: str, 
+        top_k: int = 6, 
+        namespace: Optional[str] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, List[Dict[str, Any]], str]:
+        retrieval = self._rerank(
+            self.retrieve_scored(query, top_k=self._fetch_k(top_k), namespace=namespace, filters=filters), top_k
+        )
+        docs, vector = retrieval.docs, retrieval.vector
+        cached = self._cached_answer(query, namespace, docs, vector, conversation_history)
+        if cached is not None:
+            return cached["answer"], cached["sources"], cached["confidence_override"]
+
+        messages = self._build_messages(query, docs, conversation_history)
+        with stage("chat.llm"):
+            response = self.llm.invoke(messages)
+        answer = response.content if hasattr(response, "content") else str(response)
+        self._record_usage(messages, answer, getattr(response, "usage_metadata", None))
+
+        sources = self._build_sources(docs, retrieval.scores)
 
         # Apply construction validation and safety checks
-        enhanced_answer, confidence_override = construction_validator.enhance_response_with_validation(
-            query, answer, sources
+        with stage("chat.validate"):
+            enhanced_answer, confidence_override = construction_validator.enhance_response_with_validation(
+                query, answer, sources, self._page_facts(namespace, sources)
+            )
+
+        self._store_answer(query, namespace, docs, vector, conversation_history, enhanced_answer, sources, confidence_override)
+        return enhanced_answer, sources, confidence_override
+
+    async def aanswer_query(
+        self,
+        query: str,
+        top_k: int = 6,
+        namespace: Optional[str] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, List[Dict[str, Any]], str]:
+        """Async variant of :meth:`answer_query` that never blocks the event loop.
+
+        The query is embedded and the answer generated through the async
+        OpenAI clients; the vector search itself runs in the default executor
+        because the Pinecone client is synchronous.
+        """
+        retrieval = self._rerank(
+            await self.aretrieve_scored(query, top_k=self._fetch_k(top_k), namespace=namespace, filters=filters), top_k
         )
+        docs, vector = retrieval.docs, retrieval.vector
+        cached = self._cached_answer(query, namespace, docs, vector, conversation_history)
+        if cached is not None:
+            return cached["answer"], cached["sources"], cached["confidence_override"]
+
+        messages = self._build_messages(query, docs, conversation_history)
+        with stage("chat.llm"):
+            response = await self.llm.ainvoke(messages)
+        answer = response.content if hasattr(response, "content") else str(response)
+        self._record_usage(messages, answer, getattr(response, "usage_metadata", None))
+
+        sources = self._build_sources(docs, retrieval.scores)
 
+        # Apply construction validation and safety checks
+        with stage("chat.validate"):
+            enhanced_answer, confidence_override = construction_validator.enhance_response_with_validation(
+                query, answer, sources, self._page_facts(namespace, sources)
+            )
+
+        self._store_answer(query, namespace, docs, vector, conversation_history, enhanced_answer, sources, confidence_override)
         return enhanced_answer, sources, confidence_override
 
+    async def astream_answer(
+        self,
+        query: str,
+        top_k: int = 6,
+        namespace: Optional[str] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream an answer as events: ``sources``, then ``token``s, then ``done``.
+
+        The ``done`` event carries the validator's output: the enhanced
+        answer (with any safety warnings applied), the warnings and the
+        confidence override.
+        """
+        retrieval = self._rerank(
+            await self.aretrieve_scored(query, top_k=self._fetch_k(top_k), namespace=namespace, filters=filters), top_k
+        )
+        docs, vector = retrieval.docs, retrieval.vector
+        cached = self._cached_answer(query, namespace, docs, vector, conversation_history)
+        if cached is not None:
+            sources = cached["sources"]
+            yield {"event": "sources", "sources": sources}
+            yield {"event": "token", "text": cached["answer"]}
+            with stage("chat.validate"):
+                validation = construction_validator.validate_measurement_query(
+                    query, sources, self._page_facts(namespace, sources)
+                )
+            yield {
+                "event": "done",
+                "answer": cached["answer"],
+                "warnings": validation.get("warnings", []),
+                "confidence_override": cached["confidence_override"],
+            }
+            return
+
+        sources = self._build_sources(docs, retrieval.scores)
+        yield {"event": "sources", "sources": sources}
+
+        messages = self._build_messages(query, docs, conversation_history)
+        parts: List[str] = []
+        usage: Optional[Dict[str, Any]] = None
+        started = time.perf_counter()
+        with stage("chat.llm"):
+            async for chunk in self.llm.astream(messages):
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = chunk.content if hasattr(chunk, "content") else str(chunk)
+                if text:
+                    if not parts:
+                        observe_stage("chat.first_token", time.perf_counter() - started)
+                    parts.append(text)
+                    yield {"event": "token", "text": text}
+        answer = "".join(parts)
+        self._record_usage(messages, answer, usage)
+
+        with stage("chat.validate"):
+            page_facts = self._page_facts(namespace, sources)
+            validation = construction_validator.validate_measurement_query(query, sources, page_facts)
+            enhanced_answer, confidence_override = construction_validator.enhance_response_with_validation(
+                query, answer, sources, page_facts
+            )
+        self._store_answer(query, namespace, docs, vector, conversation_history, enhanced_answer, sources, confidence_override)
+        yield {
+            "event": "done",
+            "answer": enhanced_answer,
+            "warnings": validation.get("warnings", []),
+            "confidence_override": confidence_override,
+        }
+
+    def _search(
+        self,
+        query: str,
+        vector: List[float],
+        top_k: int,
+        namespace: Optional[str],
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Document, Dict[str, float]]]:
+        """Filtered retrieval; see :meth:`_search_filtered`.
+
+        ``filters`` holds :func:`build_metadata_filter` arguments plus an
+        optional ``detect_sheets`` flag. Sheet numbers named in the query are
+        added as a filter, which is dropped again if nothing matches it (the
+        drawing may not be indexed under that number).
+        """
+        filters = dict(filters or {})
+        detect_sheets = filters.pop("detect_sheets", None)
+        if detect_sheets is None:
+            detect_sheets = settings.sheet_filter_from_query
+        flt = build_metadata_filter(**filters)
+        sheets = detect_sheet_numbers(query) if detect_sheets and not filters.get("sheets") else []
+        if sheets:
+            hits = self._search_filtered(
+                query, vector, top_k, namespace, build_metadata_filter(**filters, sheets=sheets)
+            )
+            if hits:
+                return hits
+        return self._search_filtered(query, vector, top_k, namespace, flt)
+
+    def _search_filtered(
+        self,
+        query: str,
+        vector: List[float],
+        top_k: int,
+        namespace: Optional[str],
+        flt: Optional[Dict[str, Any]],
+    ) -> List[Tuple[Document, Dict[str, float]]]:
+        """Vector top-k, fused with BM25 results by reciprocal rank when hybrid search is on.
+
+        Each document comes with the raw scores that found it: ``vector``
+        (similarity), ``lexical`` (BM25) and, for hybrid search, ``fused``.
+        """
+        vectorstore = self.vectorstore_for(namespace)
+        if self.lexical_index is None:
+            with stage("chat.vector"):
+                results = vectorstore.similarity_search_by_vector_with_score(vector, k=top_k, filter=flt)
+            return [(doc, {"vector": float(score)}) for doc, score in results]
+
+        fetch_k = max(top_k, settings.hybrid_fetch_k)
+        with stage("chat.vector"):
+            dense = vectorstore.similarity_search_by_vector_with_score(vector, k=fetch_k, filter=flt)
+        with stage("chat.lexical"):
+            sparse = self.lexical_index.search(namespace or settings.pinecone_namespace, query, k=fetch_k, flt=flt)
+        dense_ids = chunk_ids_for([doc for doc, _ in dense])
+        sparse_ids = chunk_ids_for([doc for doc, _ in sparse])
+        raw: Dict[str, Dict[str, float]] = {}
+        for chunk_id, (_, score) in zip(dense_ids, dense):
+            raw.setdefault(chunk_id, {})["vector"] = float(score)
+        for chunk_id, (_, score) in zip(sparse_ids, sparse):
+            raw.setdefault(chunk_id, {})["lexical"] = float(score)
+        fused = reciprocal_rank_fusion(
+            [
+                list(zip(dense_ids, (doc for doc, _ in dense))),
+                list(zip(sparse_ids, (doc for doc, _ in sparse))),
+            ],
+            k=settings.rrf_k,
+        )[:top_k]
+        return [
+            (doc, {**raw.get(chunk_id, {}), "fused": score})
+            for chunk_id, (doc, score) in zip(chunk_ids_for([doc for doc, _ in fused]), fused)
+        ]
+
+    @staticmethod
+    def _retrieval(query: str, vector: List[float], hits: List[Tuple[Document, Dict[str, float]]]) -> Retrieval:
+        return Retrieval(query, vector, [doc for doc, _ in hits], [scores for _, scores in hits])
+
+    def retrieve_scored(
+        self,
+        query: str,
+        top_k: int = 6,
+        namespace: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        vector: Optional[List[float]] = None,
+    ) -> Retrieval:
+        """Top-k chunks for ``query`` with their raw scores and the query embedding.
+
+        ``query`` is embedded only when no precomputed ``vector`` is passed.
+        """
+        if vector is None:
+            with stage("chat.embed"):
+                vector = self.embeddings.embed_query(query)
+        with stage("chat.retrieve"):
+            return self._retrieval(query, vector, self._search(query, vector, top_k, namespace, filters))
+
+    async def aretrieve_scored(
+        self,
+        query: str,
+        top_k: int = 6,
+        namespace: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        vector: Optional[List[float]] = None,
+    ) -> Retrieval:
+        if vector is None:
+            with stage("chat.embed"):
+                vector = await self.embeddings.aembed_query(query)
+        loop = asyncio.get_running_loop()
+        # A copied context keeps the search's stages in the caller's trace
+        context = contextvars.copy_context()
+        with stage("chat.retrieve"):
+            hits = await loop.run_in_executor(
+                None, partial(context.run, self._search, query, vector, top_k, namespace, filters)
+            )
+        return self._retrieval(query, vector, hits)
+
+    def retrieve_many(
+        self,
+        queries: List[str],
+        top_k: int = 6,
+        namespace: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        vectors: Optional[List[List[float]]] = None,
+    ) -> List[Retrieval]:
+        """:meth:`retrieve_scored` for several queries, such as the sub-questions of
+        a multi-drawing request: one batched embedding call, then the index
+        queries in parallel."""
+        if not queries:
+            return []
+        if vectors is None:
+            with stage("chat.embed"):
+                vectors = self.embeddings.embed_documents(list(queries))
+        with stage("chat.retrieve"), ThreadPoolExecutor(max_workers=len(queries)) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._search, query, vector, top_k, namespace, filters)
+                for query, vector in zip(queries, vectors)
+            ]
+            return [
+                self._retrieval(query, vector, future.result())
+                for query, vector, future in zip(queries, vectors, futures)
+            ]
+
+    async def aretrieve_many(
+        self,
+        queries: List[str],
+        top_k: int = 6,
+        namespace: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        vectors: Optional[List[List[float]]] = None,
+    ) -> List[Retrieval]:
+        if not queries:
+            return []
+        if vectors is None:
+            with stage("chat.embed"):
+                vectors = await self.embeddings.aembed_documents(list(queries))
+        loop = asyncio.get_running_loop()
+        with stage("chat.retrieve"):
+            # One copied context per search: a context can only be entered by one thread at a time
+            hits = await asyncio.gather(*(
+                loop.run_in_executor(
+                    None, partial(contextvars.copy_context().run, self._search, query, vector, top_k, namespace, filters)
+                )
+                for query, vector in zip(queries, vectors)
+            ))
+        return [self._retrieval(query, vector, h) for query, vector, h in zip(queries, vectors, hits)]
+
+    def retrieve_with_vector(
+        self,
+        query: str,
+        top_k: int = 6,
+        namespace: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        vector: Optional[List[float]] = None,
+    ) -> Tuple[List[Document], List[float]]:
+        """Top-k documents for ``query`` along with the query embedding."""
+        retrieval = self.retrieve_scored(query, top_k=top_k, namespace=namespace, filters=filters, vector=vector)
+        return retrieval.docs, retrieval.vector
+
+    async def aretrieve_with_vector(
+        self,
+        query: str,
+        top_k: int = 6,
+        namespace: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        vector: Optional[List[float]] = None,
+    ) -> Tuple[List[Document], List[float]]:
+        retrieval = await self.aretrieve_scored(query, top_k=top_k, namespace=namespace, filters=filters, vector=vector)
+        return retrieval.docs, retrieval.vector
+
+    async def aretrieve(
+        self,
+        query: str,
+        top_k: int = 6,
+        namespace: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        vector: Optional[List[float]] = None,
+    ) -> List[Document]:
+        retrieval = await self.aretrieve_scored(query, top_k=top_k, namespace=namespace, filters=filters, vector=vector)
+        return retrieval.docs
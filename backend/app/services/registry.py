@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+import httpx
+
+from .rag import RAGService
+from ..config import settings
+
+
+class ServiceRegistry:
+    """Process-wide owner of the shared RAG service and its HTTP connection pools.
+
+    Routers receive the service through :func:`get_rag_service`, so OpenAI
+    clients, the Pinecone handle, the splitter and the namespace vector-store
+    cache are built once per process instead of once per request.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rag: Optional[RAGService] = None
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+        )
+
+    def rag_service(self) -> RAGService:
+        if self._rag is None:
+            with self._lock:
+                if self._rag is None:
+                    self._http_client = httpx.Client(limits=self._limits(), timeout=60.0)
+                    self._http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=60.0)
+                    self._rag = RAGService(
+                        http_client=self._http_client,
+                        http_async_client=self._http_async_client,
+                    )
+        return self._rag
+
+    def warmup(self) -> None:
+        """Build the service and open connections before the first request."""
+        rag = self.rag_service()
+        rag.vectorstore_for(settings.pinecone_namespace)
+        if settings.vector_backend.lower() == "pinecone":
+            # Forces DNS resolution and the TLS handshake to the index host
+            rag.vectorstore._index.describe_index_stats()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            http_client, http_async_client = self._http_client, self._http_async_client
+            self._rag = None
+            self._http_client = None
+            self._http_async_client = None
+        if http_client is not None:
+            http_client.close()
+        if http_async_client is not None:
+            await http_async_client.aclose()
+
+
+registry = ServiceRegistry()
+
+
+def get_rag_service() -> RAGService:
+    """FastAPI dependency returning the shared :class:`RAGService`."""
+    return registry.rag_service()
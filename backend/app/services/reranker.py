@@ -0,0 +1,98 @@
+"""
+Local reranking of retrieved chunks: lexical and drawing-aware scoring, cut to a token budget
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+from langchain.schema import Document
+
+from .lexical_index import tokenize
+from ..utils.construction_validation import MEASUREMENT_QUERY_RE
+from ..utils.sheets import detect_sheet_numbers
+from ..utils.tokens import count_tokens
+
+
+Scored = Tuple[Document, Dict[str, float]]
+
+
+class Reranker:
+    """Re-scores over-fetched candidates on the CPU, without a model.
+
+    Each candidate's score combines:
+    - its vector similarity;
+    - the share of query terms it contains (the BM25 tokenizer keeps sheet
+      numbers, member sizes and abbreviations whole);
+    - a boost when it is on a sheet the question names, or quotes that sheet
+      number;
+    - a smaller boost for chunks with dimensions or scales when the question
+      asks for a measurement.
+
+    :meth:`select` keeps the best candidates, in score order, while they fit
+    ``token_budget``. It stops at ``top_k`` and drops anything scoring under
+    ``min_score_ratio`` of the best. The top candidate is always kept.
+    """
+
+    def __init__(
+        self,
+        vector_weight: float = 1.0,
+        term_weight: float = 1.0,
+        sheet_boost: float = 0.5,
+        measurement_boost: float = 0.1,
+        min_score_ratio: float = 0.5,
+    ) -> None:
+        self.vector_weight = vector_weight
+        self.term_weight = term_weight
+        self.sheet_boost = sheet_boost
+        self.measurement_boost = measurement_boost
+        self.min_score_ratio = min_score_ratio
+
+    def score(self, query: str, candidates: Sequence[Scored]) -> List[float]:
+        terms = set(tokenize(query))
+        sheets = {s.upper() for s in detect_sheet_numbers(query)}
+        measurement = bool(MEASUREMENT_QUERY_RE.search(query))
+        results: List[float] = []
+        for doc, scores in candidates:
+            metadata = doc.metadata or {}
+            score = self.vector_weight * max(scores.get("vector", 0.0), 0.0)
+            if terms:
+                score += self.term_weight * len(terms & set(tokenize(doc.page_content))) / len(terms)
+            if sheets:
+                sheet = str(metadata.get("sheet") or "").upper()
+                # Whole sheet numbers only: A3.2 must not match A3.20 or A3.2.1
+                quoted = {s.upper() for s in detect_sheet_numbers(doc.page_content)}
+                if sheet in sheets or sheets & quoted:
+                    score += self.sheet_boost
+            if measurement and (metadata.get("dimensions") or metadata.get("scales")):
+                score += self.measurement_boost
+            results.append(score)
+        return results
+
+    def select(
+        self,
+        query: str,
+        candidates: Sequence[Scored],
+        top_k: int,
+        token_budget: int = 0,
+        model: str = "",
+    ) -> List[Scored]:
+        """Best candidates for the prompt, each with its ``rerank`` score added."""
+        if not candidates:
+            return []
+        ranked = sorted(
+            zip(candidates, self.score(query, candidates)), key=lambda item: item[1], reverse=True
+        )
+        best = ranked[0][1]
+        selected: List[Scored] = []
+        used = 0
+        for (doc, scores), score in ranked:
+            if len(selected) >= top_k:
+                break
+            if selected and score < best * self.min_score_ratio:
+                break
+            tokens = count_tokens(doc.page_content, model) if token_budget else 0
+            if selected and token_budget and used + tokens > token_budget:
+                continue  # a shorter chunk further down may still fit
+            used += tokens
+            selected.append((doc, {**scores, "rerank": round(score, 6)}))
+        return selected
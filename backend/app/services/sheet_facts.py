@@ -0,0 +1,100 @@
+"""
+Per-page index of N.T.S. markings, scales and dimensions (SQLite), built during ingestion
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..config import settings
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_facts (
+    namespace TEXT NOT NULL,
+    source TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    facts TEXT NOT NULL,
+    PRIMARY KEY (namespace, source, page)
+) WITHOUT ROWID;
+"""
+
+PageKey = Tuple[str, int]
+
+
+class SheetFactsIndex:
+    """Measurement facts for every ingested page, keyed by ``(source, page)``.
+
+    Ingestion writes one row per extracted page from all of its blocks, not
+    just the chunks that get retrieved. Looked-up pages stay in memory until
+    SQLite's ``data_version`` shows another connection has written, so a
+    repeated lookup is a dict access.
+    """
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._pages: Dict[Tuple[str, str, int], Optional[Dict[str, Any]]] = {}
+        self._version: Optional[int] = None
+
+    def put_page(self, namespace: str, source: str, page: int, facts: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_facts (namespace, source, page, facts) VALUES (?, ?, ?, ?)",
+                (namespace, source, page, json.dumps(facts)),
+            )
+            self._conn.commit()
+            self._pages.clear()
+
+    def trim_file(self, namespace: str, source: str, page_count: int) -> None:
+        """Forget pages a file no longer has."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM page_facts WHERE namespace = ? AND source = ? AND page >= ?",
+                (namespace, source, page_count),
+            )
+            self._conn.commit()
+            self._pages.clear()
+
+    def lookup(self, namespace: str, keys: Iterable[PageKey]) -> Dict[PageKey, Dict[str, Any]]:
+        """Facts for each ``(source, page)`` that has been ingested."""
+        found: Dict[PageKey, Dict[str, Any]] = {}
+        with self._lock:
+            # data_version only changes when another connection commits
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._version:
+                self._pages.clear()
+                self._version = version
+            for source, page in set(keys):
+                key = (namespace, source, page)
+                if key not in self._pages:
+                    row = self._conn.execute(
+                        "SELECT facts FROM page_facts WHERE namespace = ? AND source = ? AND page = ?", key
+                    ).fetchone()
+                    self._pages[key] = json.loads(row[0]) if row else None
+                if self._pages[key] is not None:
+                    found[(source, page)] = self._pages[key]
+        return found
+
+
+_shared_index: Optional[SheetFactsIndex] = None
+_shared_index_lock = threading.Lock()
+
+
+def get_sheet_facts() -> SheetFactsIndex:
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = SheetFactsIndex(settings.sheet_facts_path)
+        return _shared_index
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import weakref
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from ..config import settings
+
+
+# Metadata field Pinecone stores chunk text under
+PINECONE_TEXT_KEY = "text"
+
+# Namespace of each Pinecone store built by create_vectorstore, so raw upserts
+# don't depend on langchain-pinecone's private attributes
+_pinecone_namespaces: "weakref.WeakKeyDictionary[VectorStore, str]" = weakref.WeakKeyDictionary()
+
+
+@lru_cache()
+def _pinecone_index() -> Any:
+    """One Pinecone client and index handle shared by every namespace."""
+    from pinecone import Pinecone
+
+    return Pinecone(api_key=settings.pinecone_api_key).Index(settings.pinecone_index_name)
+
+
+def create_vectorstore(embeddings: Embeddings, namespace: str) -> VectorStore:
+    """Build the configured vector store backend bound to ``namespace``.
+
+    ``VECTOR_BACKEND=pinecone`` (default) talks to the hosted index;
+    ``VECTOR_BACKEND=local`` uses the in-process NumPy index under
+    ``LOCAL_INDEX_DIR``.
+    """
+    backend = settings.vector_backend.lower()
+    if backend == "local":
+        from .local_index import LocalVectorStore
+
+        return LocalVectorStore(
+            settings.local_index_dir,
+            embeddings,
+            namespace=namespace,
+            mode=settings.local_index_mode,
+            nlist=settings.local_index_nlist,
+            nprobe=settings.local_index_nprobe,
+        )
+    if backend == "pinecone":
+        from langchain_pinecone import PineconeVectorStore
+
+        store = PineconeVectorStore(
+            index=_pinecone_index(), embedding=embeddings, text_key=PINECONE_TEXT_KEY, namespace=namespace
+        )
+        _pinecone_namespaces[store] = namespace
+        return store
+    raise ValueError(f"Unknown vector backend: {settings.vector_backend}")
+
+
+def upsert_embeddings(
+    vectorstore: VectorStore,
+    ids: List[str],
+    texts: List[str],
+    vectors: List[List[float]],
+    metadatas: List[Dict[str, Any]],
+    batch_size: int = 100,
+) -> None:
+    """Write precomputed vectors without embedding the texts again.
+
+    Pinecone upserts (for stores built by :func:`create_vectorstore`) are sent
+    in requests of at most ``batch_size`` vectors. Other stores without a
+    raw-vector path fall back to ``add_texts``.
+    """
+    from .local_index import LocalVectorStore
+
+    if isinstance(vectorstore, LocalVectorStore):
+        vectorstore.add_embeddings(texts, vectors, metadatas, ids)
+        return
+    namespace = _pinecone_namespaces.get(vectorstore)
+    if namespace is not None:
+        rows = [
+            (row_id, vector, {**metadata, PINECONE_TEXT_KEY: text})
+            for row_id, vector, metadata, text in zip(ids, vectors, metadatas, texts)
+        ]
+        for start in range(0, len(rows), batch_size):
+            _pinecone_index().upsert(vectors=rows[start:start + batch_size], namespace=namespace)
+        return
+    vectorstore.add_texts(texts, metadatas=metadatas, ids=ids)
+
+
+def compact_vectorstore(vectorstore: VectorStore) -> bool:
+    """Reclaim space held by deleted rows once they pass ``LOCAL_INDEX_COMPACT_RATIO``.
+
+    Only the local backend keeps tombstones; other stores are left alone.
+    """
+    from .local_index import LocalVectorStore
+
+    if isinstance(vectorstore, LocalVectorStore):
+        return vectorstore.compact_if_needed(settings.local_index_compact_ratio)
+    return False
@@ -4,98 +4,195 @@ Construction-specific validation and guardrails for RAG responses
 import re
 from typing import List, Dict, Any, Tuple, Optional
 
+from langchain.schema import Document
+
+from .layout_chunker import parse_bbox
+
+
+# N.T.S. markings. One pattern covers every spelling since matching is case-insensitive.
+NTS_PATTERN = r"\bN\.?T\.?S\b\.?|\bnot\s+to\s+scale\b|\bno\s+scale\b"
+
+# Scale notations: 1/4" = 1'-0", 3" = 1'-0", and "Scale: ..." labels. A label
+# whose value is an N.T.S. marking is left for the N.T.S. pattern.
+ARCH_SCALE_PATTERN = r"\d+(?:/\d+)?\"\s*=\s*\d+'?-?(?:\d+\"?)?"
+SCALE_PATTERN = (
+    ARCH_SCALE_PATTERN
+    + r"|\bscale\s*[:=](?!\s*(?:n\.?t\.?s\b|not\s+to\s+scale|no\s+scale))\s*"
+    + r"(?:" + ARCH_SCALE_PATTERN + r"|1\s*:\s*\d+|[^,\n]+)"
+)
+
+# Explicit measurements: 12'-6", 12', 12.5', 6", 300mm, 30cm, 3.5m
+DIMENSION_PATTERN = (
+    r"\d+(?:\.\d+)?'(?:\s*-?\s*\d+\")?"
+    r"|\d+\""
+    r"|\d+(?:\.\d+)?\s*(?:mm|cm)\b"
+    r"|\d+\.\d+\s*m\b"
+)
+
+# Alternatives are tried left to right at each position, so a scale such as
+# 1/4" = 1'-0" is taken whole instead of as two dimensions
+MEASUREMENT_RE = re.compile(
+    f"(?P<nts>{NTS_PATTERN})|(?P<scale>{SCALE_PATTERN})|(?P<dimension>{DIMENSION_PATTERN})",
+    re.IGNORECASE,
+)
+
+MEASUREMENT_KEYWORDS = ['dimension', 'size', 'length', 'width', 'height', 'measure', 'how big', 'how long']
+MEASUREMENT_QUERY_RE = re.compile("|".join(re.escape(k) for k in MEASUREMENT_KEYWORDS), re.IGNORECASE)
+
+# Points within which two labels count as equally near a spot on the page
+VIEWPORT_SLACK = 36.0
+
 
 class ConstructionValidator:
     """Validates construction-related queries and responses for accuracy and safety"""
-    
-    def __init__(self):
-        # N.T.S. detection patterns
-        self.nts_patterns = [
-            r'\bN\.T\.S\.?\b',
-            r'\bNTS\b',
-            r'\bNot\s+to\s+Scale\b',
-            r'\bNOT\s+TO\s+SCALE\b',
-            r'\bno\s+scale\b',
-            r'\bNO\s+SCALE\b'
-        ]
-        
-        # Scale patterns
-        self.scale_patterns = [
-            r'(\d+/\d+)"\s*=\s*(\d+)\'?-?(\d+)"?',  # 1/4" = 1'-0"
-            r'(\d+)"\s*=\s*(\d+)\'?-?(\d+)"?',       # 3" = 1'-0"
-            r'Scale\s*[:=]\s*([^,\n]+)',             # Scale: 1/4" = 1'-0"
-            r'SCALE\s*[:=]\s*([^,\n]+)',             # SCALE: 1/4" = 1'-0"
-        ]
-        
-        # Dimension patterns (explicit measurements)
-        self.dimension_patterns = [
-            r"(\d+)\'?\s*-?\s*(\d+)\"",              # 12'-6"
-            r"(\d+)\'",                              # 12'
-            r"(\d+)\"",                              # 6"
-            r"(\d+\.\d+)\'",                         # 12.5'
-            r"(\d+)\s*mm",                           # 300mm
-            r"(\d+)\s*cm",                           # 30cm
-            r"(\d+\.\d+)\s*m",                       # 3.5m
-        ]
-    
+
+    def scan(self, text: str) -> Dict[str, List[str]]:
+        """N.T.S. markings, scales and dimensions in ``text``, found in a single pass"""
+        facts: Dict[str, List[str]] = {"nts": [], "scale": [], "dimension": []}
+        for match in MEASUREMENT_RE.finditer(text):
+            facts[match.lastgroup].append(match.group().strip())
+        return facts
+
     def detect_nts_markings(self, text: str) -> List[str]:
         """Detect N.T.S. (Not To Scale) markings in text"""
-        nts_found = []
-        for pattern in self.nts_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            nts_found.extend(matches)
-        return nts_found
-    
+        return self.scan(text)["nts"]
+
     def extract_scales(self, text: str) -> List[str]:
         """Extract scale notations from text"""
-        scales_found = []
-        for pattern in self.scale_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            scales_found.extend([match if isinstance(match, str) else ' '.join(match) for match in matches])
-        return scales_found
-    
+        return self.scan(text)["scale"]
+
     def extract_dimensions(self, text: str) -> List[str]:
         """Extract explicit dimension measurements from text"""
-        dimensions_found = []
-        for pattern in self.dimension_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            dimensions_found.extend([match if isinstance(match, str) else '-'.join(match) for match in matches])
-        return dimensions_found
-    
-    def validate_measurement_query(self, query: str, sources: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self.scan(text)["dimension"]
+
+    def annotate(self, doc: Document) -> Document:
+        """Store the chunk's measurement facts in its metadata at ingest time.
+
+        ``nts`` is always set and marks the chunk as scanned; the lists are
+        only added when non-empty.
+        """
+        facts = self.scan(doc.page_content)
+        metadata = {**(doc.metadata or {}), "nts": bool(facts["nts"])}
+        for key, field in (("nts", "nts_markings"), ("scale", "scales"), ("dimension", "dimensions")):
+            if facts[key]:
+                metadata[field] = facts[key]
+        doc.metadata = metadata
+        return doc
+
+    def facts_for(self, source: Dict[str, Any]) -> Dict[str, List[str]]:
+        """Measurement facts for a retrieved source: its precomputed metadata,
+        or a scan of its text for chunks ingested before annotation existed"""
+        metadata = source.get('metadata') or {}
+        if "nts" not in metadata:
+            return self.scan(source.get('text_content', ''))
+        return {
+            "nts": list(metadata.get("nts_markings") or []),
+            "scale": list(metadata.get("scales") or []),
+            "dimension": list(metadata.get("dimensions") or []),
+        }
+
+    def page_facts(self, docs: List[Document]) -> Dict[str, Any]:
+        """Measurement facts for a whole page, built at ingest from every extracted block.
+
+        N.T.S. markings and scales keep the bbox of the block they were
+        found in; each one labels a viewport (a detail, or the title block
+        for the sheet default). Dimensions are only recorded as text.
+        """
+        facts: Dict[str, Any] = {"nts": [], "scales": [], "dimensions": []}
+        for doc in docs:
+            bbox = (doc.metadata or {}).get("bbox")
+            found = self.scan(doc.page_content)
+            facts["nts"].extend({"text": text, "bbox": bbox} for text in found["nts"])
+            facts["scales"].extend({"text": text, "bbox": bbox} for text in found["scale"])
+            facts["dimensions"].extend(found["dimension"])
+        facts["nts"] = list({(e["text"], e["bbox"]): e for e in facts["nts"]}.values())
+        facts["scales"] = list({(e["text"], e["bbox"]): e for e in facts["scales"]}.values())
+        facts["dimensions"] = list(dict.fromkeys(facts["dimensions"]))
+        return facts
+
+    def viewport_facts(self, page_facts: Dict[str, Any], bbox: Any) -> Dict[str, List[str]]:
+        """N.T.S. markings and scales that apply to a region of a page.
+
+        Each label's viewport is the part of the page nearer to it than to any
+        other label. Every label whose viewport ``bbox`` reaches (at its
+        corners or centre, within ``VIEWPORT_SLACK`` points) applies, so a
+        region spanning an N.T.S. detail and a scaled one reports both.
+        Without a bbox, every label on the page applies.
+        """
+        labels = [("nts", entry) for entry in page_facts.get("nts", [])]
+        labels += [("scale", entry) for entry in page_facts.get("scales", [])]
+        facts: Dict[str, List[str]] = {"nts": [], "scale": []}
+        box = parse_bbox(bbox)
+        located = [(kind, entry, parse_bbox(entry.get("bbox"))) for kind, entry in labels]
+        located = [item for item in located if item[2] is not None]
+        if box is None or not located:
+            for kind, entry in labels:
+                facts[kind].append(entry["text"])
+            return facts
+
+        def distance(point: Tuple[float, float], label: Tuple[float, float, float, float]) -> float:
+            dx = max(label[0] - point[0], point[0] - label[2], 0.0)
+            dy = max(label[1] - point[1], point[1] - label[3], 0.0)
+            return (dx * dx + dy * dy) ** 0.5
+
+        x0, y0, x1, y1 = box
+        points = [(x0, y0), (x1, y0), (x0, y1), (x1, y1), ((x0 + x1) / 2, (y0 + y1) / 2)]
+        applies = set()
+        for point in points:
+            distances = [distance(point, label_box) for _, _, label_box in located]
+            nearest = min(distances)
+            applies.update(i for i, d in enumerate(distances) if d <= nearest + VIEWPORT_SLACK)
+        for i in sorted(applies):
+            kind, entry, _ = located[i]
+            if entry["text"] not in facts[kind]:
+                facts[kind].append(entry["text"])
+        return facts
+
+    def validate_measurement_query(
+        self,
+        query: str,
+        sources: List[Dict[str, Any]],
+        page_facts: Optional[Dict[Tuple[str, int], Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
         """
         Validate queries asking for measurements against N.T.S. and scale availability
+
+        ``page_facts`` maps ``(source, page)`` to :meth:`page_facts` output from
+        ingestion, so markings outside the retrieved chunks are checked too
         """
         # Check if query is asking for measurements
-        measurement_keywords = ['dimension', 'size', 'length', 'width', 'height', 'measure', 'how big', 'how long']
-        is_measurement_query = any(keyword in query.lower() for keyword in measurement_keywords)
-        
-        if not is_measurement_query:
+        if not MEASUREMENT_QUERY_RE.search(query):
             return {"safe": True, "warnings": []}
-        
+
         warnings = []
         nts_found = False
         scales_available = []
         explicit_dimensions = []
-        
+
         # Check all sources for N.T.S. markings and scales
+        pages_seen = set()
         for source in sources:
-            text_content = source.get('text_content', '')
-            
-            # Check for N.T.S. markings
-            nts_markings = self.detect_nts_markings(text_content)
-            if nts_markings:
+            facts = self.facts_for(source)
+            metadata = source.get('metadata') or {}
+            page_key = (metadata.get('source'), metadata.get('page'))
+            page = (page_facts or {}).get(page_key)
+            if page is not None:
+                viewport = self.viewport_facts(page, metadata.get('bbox'))
+                facts["nts"] = list(dict.fromkeys(facts["nts"] + viewport["nts"]))
+                facts["scale"] = facts["scale"] + viewport["scale"]
+                # A page's dimensions count once, however many of its chunks were retrieved
+                if page_key not in pages_seen:
+                    pages_seen.add(page_key)
+                    facts["dimension"] = facts["dimension"] + page["dimensions"]
+            if facts["nts"]:
                 nts_found = True
-                warnings.append(f"Drawing {source.get('drawing_name', 'unknown')} contains N.T.S. markings: {nts_markings}")
-            
-            # Extract scales
-            scales = self.extract_scales(text_content)
-            scales_available.extend(scales)
-            
-            # Extract explicit dimensions
-            dimensions = self.extract_dimensions(text_content)
-            explicit_dimensions.extend(dimensions)
-        
+                name = source.get('drawing_name') or metadata.get('source', 'unknown')
+                warnings.append(f"Drawing {name} contains N.T.S. markings: {facts['nts']}")
+            scales_available.extend(facts["scale"])
+            explicit_dimensions.extend(facts["dimension"])
+        scales_available = list(dict.fromkeys(scales_available))
+        explicit_dimensions = list(dict.fromkeys(explicit_dimensions))
+
         # Determine safety level
         if nts_found:
             return {
@@ -121,11 +218,17 @@ class ConstructionValidator:
             "explicit_dimensions": explicit_dimensions
         }
     
-    def enhance_response_with_validation(self, query: str, answer: str, sources: List[Dict[str, Any]]) -> Tuple[str, str]:
+    def enhance_response_with_validation(
+        self,
+        query: str,
+        answer: str,
+        sources: List[Dict[str, Any]],
+        page_facts: Optional[Dict[Tuple[str, int], Dict[str, Any]]] = None,
+    ) -> Tuple[str, str]:
         """
         Enhance response with construction validation warnings and recommendations
         """
-        validation = self.validate_measurement_query(query, sources)
+        validation = self.validate_measurement_query(query, sources, page_facts)
         
         if not validation["safe"]:
             # Prepend safety warnings to answer
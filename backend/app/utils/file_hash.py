@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_REF_RE = re.compile(r"(\d+) 0 R")
+# Back-references out of a resource tree, which would pull in the whole document
+_BACKREF_RE = re.compile(r"/(Parent|P|StructParent|StructParents)\s+\d+( 0 R)?")
+
+
+def _page_resources(pdf: "fitz.Document", page: "fitz.Page") -> str:
+    """The page's ``/Resources`` entry, inherited from the page tree if need be."""
+    xref = page.xref
+    while True:
+        kind, value = pdf.xref_get_key(xref, "Resources")
+        if kind != "null":
+            return value
+        kind, parent = pdf.xref_get_key(xref, "Parent")
+        if kind != "xref":
+            return ""
+        xref = int(parent.split()[0])
+
+
+def _hash_object(pdf: "fitz.Document", xref: int) -> Tuple[bytes, List[int]]:
+    source = pdf.xref_object(xref, compressed=True)
+    digest = hashlib.sha256(source.encode())
+    if pdf.xref_is_stream(xref):
+        digest.update(pdf.xref_stream_raw(xref) or b"")
+    return digest.digest(), [int(ref) for ref in _REF_RE.findall(_BACKREF_RE.sub("", source))]
+
+
+def hash_pdf_page(pdf: "fitz.Document", page: "fitz.Page", memo: Optional[Dict[int, Tuple[bytes, List[int]]]] = None) -> str:
+    """Content hash of one page: geometry, content streams and every object
+    its resources reach, so form XObjects, nested images and fonts count.
+
+    This is enough to tell whether a page would extract differently without
+    actually running text extraction or OCR on it. ``memo`` caches per-object
+    hashes across pages of the same document. A page whose resources cannot
+    be walked is hashed by a low-resolution render instead.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{tuple(page.rect)}|{page.rotation}".encode())
+    digest.update(page.read_contents() or b"")
+    memo = {} if memo is None else memo
+    try:
+        resources = _page_resources(pdf, page)
+        digest.update(resources.encode())
+        pending = [int(ref) for ref in _REF_RE.findall(resources)]
+        seen = set()
+        while pending:
+            xref = pending.pop()
+            if xref in seen:
+                continue
+            seen.add(xref)
+            if xref not in memo:
+                memo[xref] = _hash_object(pdf, xref)
+            object_hash, refs = memo[xref]
+            digest.update(object_hash)
+            pending.extend(refs)
+    except Exception:
+        digest.update(page.get_pixmap(dpi=36, alpha=False).samples)
+    return digest.hexdigest()
+
+
+_hash_memo: Dict[Tuple[str, int, int], str] = {}
+_hash_memo_lock = threading.Lock()
+
+
+def cached_file_hash(path: str) -> str:
+    """:func:`hash_file`, memoized on (path, mtime, size) so repeat calls are a stat()."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _hash_memo_lock:
+        cached = _hash_memo.get(key)
+    if cached is not None:
+        return cached
+    digest = hash_file(path)
+    with _hash_memo_lock:
+        if len(_hash_memo) > 4096:
+            _hash_memo.clear()
+        _hash_memo[key] = digest
+    return digest
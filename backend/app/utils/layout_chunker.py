@@ -0,0 +1,206 @@
+"""
+Drawing-aware chunking: groups spatially adjacent text blocks into chunks with merged bboxes
+"""
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+
+Box = Tuple[float, float, float, float]
+
+# Sentence ends, and the start of a numbered or lettered note ("3. ", "B) ")
+SENTENCE_BREAK_RE = re.compile(r"(?<=[.;:!?])\s+(?=\S)|\n(?=\s*(?:\d{1,2}|[A-Z])[.)]\s)")
+
+
+def parse_bbox(value: object) -> Optional[Box]:
+    if not isinstance(value, str):
+        return None
+    try:
+        x0, y0, x1, y1 = (float(v) for v in value.split(","))
+    except ValueError:
+        return None
+    return x0, y0, x1, y1
+
+
+def format_bbox(box: Box) -> str:
+    return f"{box[0]:.1f},{box[1]:.1f},{box[2]:.1f},{box[3]:.1f}"
+
+
+def union_bbox(boxes: Iterable[Box]) -> Box:
+    boxes = list(boxes)
+    return (
+        min(b[0] for b in boxes),
+        min(b[1] for b in boxes),
+        max(b[2] for b in boxes),
+        max(b[3] for b in boxes),
+    )
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_BREAK_RE.split(text) if s and s.strip()]
+
+
+class LayoutChunker:
+    """Split extracted PDF blocks into chunks that follow the drawing layout.
+
+    Blocks on the same page are clustered when they share a column and are
+    within ``gap_y`` points vertically, or share a row and are within
+    ``gap_x`` points horizontally, so a general-notes column or a title
+    block ends up together. Each cluster is read top to bottom and packed
+    into chunks of whole blocks up to ``chunk_size`` characters; a block
+    that is longer on its own is cut at sentence boundaries, with a bbox
+    proportional to its share of the block. Chunks carry the union bbox of
+    what they contain.
+
+    OCR blocks are grouped the same way, but never with text-layer blocks.
+    Documents without a bbox fall back to the character splitter.
+    ``skip_block`` lets the caller drop blocks (repeated title block text)
+    before they are grouped.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        gap_x: float = 12.0,
+        gap_y: float = 16.0,
+        min_chunk_chars: int = 12,
+    ) -> None:
+        self.chunk_size = chunk_size
+        self.gap_x = gap_x
+        self.gap_y = gap_y
+        self.min_chunk_chars = min_chunk_chars
+        self.fallback = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=["\n\n", "\n", ". ", ".", " "],
+        )
+        # Stored with ingested pages so a change here re-chunks them
+        self.signature = f"layout-2|{chunk_size}|{chunk_overlap}|{gap_x:g}|{gap_y:g}|{min_chunk_chars}"
+
+    def split_documents(
+        self,
+        docs: Sequence[Document],
+        skip_block: Optional[Callable[[Document], bool]] = None,
+    ) -> List[Document]:
+        pages: Dict[Tuple[str, object, bool], List[Tuple[Document, Box]]] = {}
+        chunks: List[Document] = []
+        for doc in docs:
+            metadata = doc.metadata or {}
+            box = parse_bbox(metadata.get("bbox"))
+            if box is None:
+                chunks.extend(self.fallback.split_documents([doc]))
+                continue
+            if skip_block is not None and skip_block(doc):
+                continue
+            key = (metadata.get("path") or metadata.get("source", ""), metadata.get("page"), bool(metadata.get("ocr")))
+            pages.setdefault(key, []).append((doc, box))
+        for blocks in pages.values():
+            chunks.extend(self._split_page(blocks))
+        return chunks
+
+    def _adjacent(self, a: Box, b: Box) -> bool:
+        x_overlap = min(a[2], b[2]) - max(a[0], b[0])
+        y_overlap = min(a[3], b[3]) - max(a[1], b[1])
+        if x_overlap > 0 and y_overlap > -self.gap_y:
+            return True
+        return y_overlap > 0 and x_overlap > -self.gap_x
+
+    def _clusters(self, blocks: List[Tuple[Document, Box]]) -> List[List[Tuple[Document, Box]]]:
+        order = sorted(range(len(blocks)), key=lambda i: (blocks[i][1][1], blocks[i][1][0]))
+        parent = list(range(len(blocks)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for n, i in enumerate(order):
+            a = blocks[i][1]
+            for j in order[n + 1:]:
+                b = blocks[j][1]
+                if b[1] > a[3] + self.gap_y:
+                    break  # sorted by top edge: nothing further down can touch ``a``
+                if self._adjacent(a, b):
+                    parent[find(j)] = find(i)
+
+        groups: Dict[int, List[Tuple[Document, Box]]] = {}
+        for i in order:
+            groups.setdefault(find(i), []).append(blocks[i])
+        return list(groups.values())
+
+    def _split_page(self, blocks: List[Tuple[Document, Box]]) -> List[Document]:
+        chunks: List[Document] = []
+        for cluster in self._clusters(blocks):
+            metadata = {k: v for k, v in (cluster[0][0].metadata or {}).items() if k != "bbox"}
+            pending: List[Tuple[str, Box]] = []
+
+            def flush() -> None:
+                if pending:
+                    self._emit(chunks, metadata, "\n".join(t for t, _ in pending), union_bbox(b for _, b in pending))
+                    pending.clear()
+
+            size = 0
+            for doc, box in cluster:
+                text = doc.page_content.strip()
+                if not text:
+                    continue
+                if len(text) > self.chunk_size:
+                    pieces = self._split_block(text, box)
+                    first, first_box = pieces[0]
+                    if pending and size + 1 + len(first) <= self.chunk_size:
+                        # Keep a heading ("GENERAL NOTES") with the start of its notes
+                        pending.append((first, first_box))
+                        pieces = pieces[1:]
+                    flush()
+                    size = 0
+                    for piece, piece_box in pieces:
+                        self._emit(chunks, metadata, piece, piece_box)
+                    continue
+                if pending and size + 1 + len(text) > self.chunk_size:
+                    flush()
+                    size = 0
+                size += len(text) + (1 if pending else 0)
+                pending.append((text, box))
+            flush()
+        return chunks
+
+    def _split_block(self, text: str, box: Box) -> List[Tuple[str, Box]]:
+        """Pack a long block's sentences into chunks, each with the slice of the
+        block's height that its characters cover."""
+        pieces: List[str] = []
+        current = ""
+        for sentence in split_sentences(text):
+            if len(sentence) > self.chunk_size:
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.extend(self.fallback.split_text(sentence))
+                continue
+            candidate = f"{current} {sentence}" if current else sentence
+            if len(candidate) > self.chunk_size:
+                pieces.append(current)
+                candidate = sentence
+            current = candidate
+        if current:
+            pieces.append(current)
+
+        total = sum(len(p) for p in pieces) or 1
+        height = box[3] - box[1]
+        results: List[Tuple[str, Box]] = []
+        offset = 0
+        for piece in pieces:
+            top = box[1] + height * offset / total
+            offset += len(piece)
+            results.append((piece, (box[0], top, box[2], box[1] + height * offset / total)))
+        return results
+
+    def _emit(self, chunks: List[Document], metadata: Dict, text: str, box: Box) -> None:
+        if len(text) < self.min_chunk_chars:
+            return
+        chunks.append(Document(page_content=text, metadata={**metadata, "bbox": format_bbox(box)}))
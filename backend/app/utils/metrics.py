@@ -0,0 +1,201 @@
+"""
+Stage timings, token counts and cache hit counters, exported in Prometheus text format
+"""
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+# Seconds; spans everything from a cache lookup to an OCR'd page or a slow LLM call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: (count per bucket, sum, total count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            if index < len(counts):
+                counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "construction_rag_stage_seconds",
+    "Time spent per stage of chat, ingestion and page rendering.",
+    ["stage"],
+)
+TOKENS = Counter(
+    "construction_rag_tokens_total",
+    "Tokens sent to and received from OpenAI.",
+    ["kind"],
+)
+CACHE_REQUESTS = Counter(
+    "construction_rag_cache_requests_total",
+    "Cache lookups by cache and result.",
+    ["cache", "result"],
+)
+
+METRICS = (STAGE_SECONDS, TOKENS, CACHE_REQUESTS)
+
+
+@dataclass
+class Trace:
+    """Spans and token counts of one request, for the /chat debug block.
+
+    With ``record`` off, stages are only collected here and not observed;
+    work done in an extraction process is replayed by the parent through
+    :func:`record_stages` instead.
+    """
+
+    record: bool = True
+    spans: List[Tuple[str, float]] = field(default_factory=list)
+    tokens: Dict[str, int] = field(default_factory=dict)
+    caches: Dict[str, str] = field(default_factory=dict)  # last result per cache
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("metrics_trace", default=None)
+
+
+@contextmanager
+def trace(record: bool = True) -> Iterator[Trace]:
+    """Collect the stages and tokens recorded in this context (including
+    work handed to executors with a copied context)."""
+    current = Trace(record=record)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as ``name`` in the stage histogram and the current trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    current = _current_trace.get()
+    if current is not None:
+        current.spans.append((name, seconds))
+        if not current.record:
+            return
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def record_stages(spans: Iterable[Tuple[str, float]]) -> None:
+    """Observe spans collected elsewhere, e.g. returned by a worker process."""
+    for name, seconds in spans:
+        observe_stage(name, seconds)
+
+
+def record_tokens(kind: str, amount: int) -> None:
+    if amount <= 0:
+        return
+    TOKENS.inc(amount, kind=kind)
+    current = _current_trace.get()
+    if current is not None:
+        current.tokens[kind] = current.tokens.get(kind, 0) + amount
+
+
+def cache_result(cache: str, result: str, amount: int = 1) -> None:
+    if amount <= 0:
+        return
+    CACHE_REQUESTS.inc(amount, cache=cache, result=result)
+    current = _current_trace.get()
+    if current is not None:
+        current.caches[cache] = result
+
+
+def render_latest() -> str:
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
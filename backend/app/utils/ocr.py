@@ -0,0 +1,213 @@
+"""
+Selective OCR: picks the page regions that need it, sizes the DPI to the region and caches results on disk
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+import pytesseract
+
+from .metrics import cache_result
+from ..config import settings
+
+
+Box = Tuple[float, float, float, float]
+
+# Bump when region selection or the stored format changes
+OCR_VERSION = "ocr-3"
+DENSITY_GRID = 8
+
+
+def text_density(page_rect: "fitz.Rect", text_boxes: Iterable[Box], grid: int = DENSITY_GRID) -> float:
+    """Share of a ``grid`` x ``grid`` split of the page holding the centre of a selectable text block.
+
+    A title block or review stamp lands in a handful of cells however much
+    text it has; labels spread over a drawing's text layer land in many.
+    """
+    cells = set()
+    width, height = page_rect.width or 1, page_rect.height or 1
+    for x0, y0, x1, y1 in text_boxes:
+        col = int(((x0 + x1) / 2 - page_rect.x0) / width * grid)
+        row = int(((y0 + y1) / 2 - page_rect.y0) / height * grid)
+        cells.add((min(max(col, 0), grid - 1), min(max(row, 0), grid - 1)))
+    return len(cells) / (grid * grid)
+
+
+def _merge(rects: List["fitz.Rect"]) -> List["fitz.Rect"]:
+    merged: List[fitz.Rect] = []
+    for rect in rects:
+        rect = fitz.Rect(rect)
+        changed = True
+        while changed:
+            changed = False
+            for other in merged:
+                if rect.intersects(other):
+                    rect |= other
+                    merged.remove(other)
+                    changed = True
+                    break
+        merged.append(rect)
+    return merged
+
+
+def image_regions(page: "fitz.Page", text_boxes: Sequence[Tuple[Box, int]], min_points: float, min_chars: int) -> List["fitz.Rect"]:
+    """Embedded raster images at least ``min_points`` on each side whose area
+    holds fewer than ``min_chars`` selectable characters, merged where they overlap."""
+    rects = []
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page.rect
+        if rect.is_empty or rect.width < min_points or rect.height < min_points:
+            continue
+        covered = sum(chars for box, chars in text_boxes if rect.contains(fitz.Rect(box)))
+        if covered < min_chars:
+            rects.append(rect)
+    return _merge(rects)
+
+
+def ocr_regions(page: "fitz.Page", text_boxes: Sequence[Tuple[Box, int]], min_chars: int) -> List["fitz.Rect"]:
+    """Regions of ``page`` to OCR, given its selectable ``(bbox, characters)`` blocks.
+
+    Only a page with next to no text layer (fewer than
+    ``OCR_FULL_PAGE_MAX_CHARS`` characters, spread over less than
+    ``OCR_TEXT_DENSITY`` of the page), such as a scan, is OCR'd whole. Any
+    other page only has its embedded raster images OCR'd; its vector line
+    work and selectable labels are left alone.
+    """
+    chars = sum(count for _, count in text_boxes)
+    if (
+        chars < settings.ocr_full_page_max_chars
+        and text_density(page.rect, (box for box, _ in text_boxes)) < settings.ocr_text_density
+    ):
+        return [fitz.Rect(page.rect)]
+    return image_regions(page, text_boxes, settings.ocr_min_image_points, min_chars)
+
+
+def drop_text_layer_overlaps(
+    blocks: Sequence[Tuple[Box, str]], text_boxes: Sequence[Tuple[Box, int]], max_overlap: float = 0.5
+) -> List[Tuple[Box, str]]:
+    """OCR blocks minus those lying mostly (over ``max_overlap`` of their area)
+    on selectable text, which the text layer already indexes."""
+    kept = []
+    for box, text in blocks:
+        rect = fitz.Rect(box)
+        area = rect.get_area() or 1.0
+        covered = sum((rect & fitz.Rect(other)).get_area() for other, _ in text_boxes)
+        if covered / area <= max_overlap:
+            kept.append((box, text))
+    return kept
+
+
+def ocr_dpi_for(rect: "fitz.Rect", dpi: Optional[int] = None) -> int:
+    """``dpi`` if given, else ``OCR_DPI``; 0 picks ``OCR_MAX_DPI`` lowered until the
+    region stays under ``OCR_MAX_MEGAPIXELS`` (but not below ``OCR_MIN_DPI``)."""
+    dpi = settings.ocr_dpi if dpi is None else dpi
+    if dpi > 0:
+        return dpi
+    square_inches = max(rect.width * rect.height / (72 * 72), 1e-6)
+    fitted = int(math.sqrt(settings.ocr_max_megapixels * 1_000_000 / square_inches))
+    return max(settings.ocr_min_dpi, min(settings.ocr_max_dpi, fitted))
+
+
+def ocr_signature(dpi: Optional[int] = None, min_chars: int = 0) -> str:
+    """Settings that change which regions are OCR'd or how; part of every
+    cache key. ``min_chars`` is the one passed to :func:`ocr_regions`."""
+    return "|".join(
+        str(v)
+        for v in (
+            OCR_VERSION,
+            DENSITY_GRID,
+            min_chars,
+            settings.ocr_dpi if dpi is None else dpi,
+            settings.ocr_min_dpi,
+            settings.ocr_max_dpi,
+            settings.ocr_max_megapixels,
+            settings.ocr_text_density,
+            settings.ocr_full_page_max_chars,
+            settings.ocr_min_image_points,
+            settings.ocr_min_confidence,
+        )
+    )
+
+
+def ocr_blocks(img: "Image.Image", rect: "fitz.Rect", min_confidence: float = 0.0) -> List[Tuple[Box, str]]:
+    """Words from one tesseract pass over ``img`` (a raster of ``rect``), grouped
+    into its paragraphs with page-space bboxes, like PyMuPDF text blocks."""
+    data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+    scale_x = rect.width / img.width
+    scale_y = rect.height / img.height
+    paragraphs: Dict[Tuple[int, int], Dict[int, List[int]]] = {}
+    for i, word in enumerate(data["text"]):
+        if not word or not word.strip() or float(data["conf"][i]) < max(min_confidence, 0):
+            continue
+        lines = paragraphs.setdefault((data["block_num"][i], data["par_num"][i]), {})
+        lines.setdefault(data["line_num"][i], []).append(i)
+
+    blocks: List[Tuple[Box, str]] = []
+    for lines in paragraphs.values():
+        words = [i for line in lines.values() for i in line]
+        left = min(data["left"][i] for i in words)
+        top = min(data["top"][i] for i in words)
+        right = max(data["left"][i] + data["width"][i] for i in words)
+        bottom = max(data["top"][i] + data["height"][i] for i in words)
+        text = "\n".join(" ".join(data["text"][i].strip() for i in line) for line in lines.values())
+        box = (
+            rect.x0 + left * scale_x,
+            rect.y0 + top * scale_y,
+            rect.x0 + right * scale_x,
+            rect.y0 + bottom * scale_y,
+        )
+        blocks.append((box, text))
+    return blocks
+
+
+def ocr_region(page: "fitz.Page", rect: "fitz.Rect", dpi: Optional[int] = None) -> Tuple[List[Tuple[Box, str]], "fitz.Pixmap"]:
+    """Rasterize one region at its own DPI and OCR it into text blocks. The
+    raster is returned too, so a whole-page one can be reused."""
+    pix = page.get_pixmap(dpi=ocr_dpi_for(rect, dpi), clip=rect, alpha=False)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    return ocr_blocks(img, rect, settings.ocr_min_confidence), pix
+
+
+class OcrCache:
+    """On-disk OCR results keyed by page content hash and OCR settings.
+
+    Files are written atomically, so extraction worker processes can share it.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    @staticmethod
+    def make_key(page_hash: str, signature: str) -> str:
+        return hashlib.sha256(f"{page_hash}|{signature}".encode()).hexdigest()[:32]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[Tuple[Box, str]]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                blocks = json.load(f)["blocks"]
+        except (OSError, ValueError, KeyError):
+            cache_result("ocr", "miss")
+            return None
+        cache_result("ocr", "hit")
+        return [(tuple(box), text) for box, text in blocks]
+
+    def put(self, key: str, blocks: List[Tuple[Box, str]]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"blocks": [[list(box), text] for box, text in blocks]}, f)
+        os.replace(tmp_path, path)
+
+
+ocr_cache = OcrCache(settings.ocr_cache_dir)
@@ -1,42 +1,146 @@
 from __future__ import annotations
 
-from typing import List
+import logging
+from typing import Any, Iterator, List, Optional, Sequence
 
 import fitz  # PyMuPDF
-from PIL import Image
-import pytesseract
 from langchain.schema import Document
 
+from .file_hash import hash_pdf_page
+from .metrics import stage
+from .ocr import drop_text_layer_overlaps, ocr_cache, ocr_region, ocr_regions, ocr_signature
+from .render_cache import prerender_page
+from .sheets import sheet_metadata
+from ..config import settings
 
-def extract_documents_from_pdf(
+
+logger = logging.getLogger(__name__)
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """Return the number of pages in a PDF without extracting anything."""
+    with fitz.open(pdf_path) as pdf:
+        return len(pdf)
+
+
+def iter_documents_from_pdf(
     pdf_path: str,
     *,
     ocr_fallback: bool = True,
-    ocr_dpi: int = 300,
+    ocr_dpi: Optional[int] = None,
     min_block_chars: int = 40,
-) -> List[Document]:
-    """Extract text blocks from a PDF using PyMuPDF, with optional OCR fallback.
+    ocr_min_chars: Optional[int] = None,
+    pages: Optional[Sequence[int]] = None,
+    prerender_hash: Optional[str] = None,
+) -> Iterator[Document]:
+    """Yield text blocks from a PDF page by page, with optional OCR fallback.
 
     - Splits per text block to preserve layout
-    - Filters tiny blocks
-    - Adds page and bbox metadata
+    - Filters blocks shorter than ``min_block_chars``
+    - OCRs pages with next to no selectable text, and only the embedded
+      raster images of the others (see :func:`ocr_regions`); OCR blocks lying
+      on selectable text are dropped as duplicates, and OCR output under ``ocr_min_chars`` (default
+      ``min_block_chars``) characters is dropped; a region whose OCR fails
+      is logged and skipped, and the page keeps its text-layer blocks
+    - ``ocr_dpi`` overrides ``OCR_DPI``; OCR results are cached by page
+      content hash when ``OCR_CACHE_ENABLED``
+    - Adds page and bbox metadata, plus sheet number, sheet series and
+      discipline when the file name starts with a sheet number
+    - ``pages`` restricts extraction to the given page indices
+    - ``prerender_hash`` (the file's content hash) also stores viewer
+      renditions of each page, reusing the OCR raster when there is one
+
+    Only one page's blocks (and OCR raster) are alive at a time.
     """
+    with fitz.open(pdf_path) as pdf:
+        page_indices = range(len(pdf)) if pages is None else pages
+        for page_index in page_indices:
+            yield from _extract_page_documents(
+                pdf,
+                pdf[page_index],
+                pdf_path,
+                page_index,
+                ocr_fallback=ocr_fallback,
+                ocr_dpi=ocr_dpi,
+                min_block_chars=min_block_chars,
+                ocr_min_chars=min_block_chars if ocr_min_chars is None else ocr_min_chars,
+                prerender_hash=prerender_hash,
+            )
+
+
+def extract_documents_from_pdf(pdf_path: str, **kwargs: Any) -> List[Document]:
+    """Extract all documents of a PDF; see :func:`iter_documents_from_pdf`."""
+    return list(iter_documents_from_pdf(pdf_path, **kwargs))
+
+
+def _extract_page_documents(
+    pdf: "fitz.Document",
+    page: "fitz.Page",
+    pdf_path: str,
+    page_index: int,
+    *,
+    ocr_fallback: bool,
+    ocr_dpi: Optional[int],
+    min_block_chars: int,
+    ocr_min_chars: int,
+    prerender_hash: Optional[str] = None,
+) -> List[Document]:
     documents: List[Document] = []
+    ocr_pix = None
+    sheet = sheet_metadata(pdf_path)
+    with stage("ingest.extract_text"):
+        blocks = page.get_text("blocks") or []
+    text_boxes = []
+    for block in blocks:
+        # block: (x0, y0, x1, y1, text, block_no, ...)
+        if len(block) < 5:
+            continue
+        x0, y0, x1, y1, text = block[0], block[1], block[2], block[3], (block[4] or "")
+        text = text.strip()
+        if not text:
+            continue
+        text_boxes.append(((x0, y0, x1, y1), len(text)))
+        if len(text) < min_block_chars:
+            continue
+        documents.append(
+            Document(
+                page_content=text,
+                metadata={
+                    "path": pdf_path,
+                    "source": pdf_path.split("/")[-1],
+                    "page": page_index,
+                    "bbox": f"{x0:.1f},{y0:.1f},{x1:.1f},{y1:.1f}",
+                    "ocr": False,
+                    **sheet,
+                },
+            )
+        )
 
-    with fitz.open(pdf_path) as pdf:
-        for page_index in range(len(pdf)):
-            page = pdf[page_index]
-            blocks = page.get_text("blocks") or []
-            total_chars = 0
-            for block in blocks:
-                # block: (x0, y0, x1, y1, text, block_no, ...)
-                if len(block) < 5:
-                    continue
-                x0, y0, x1, y1, text = block[0], block[1], block[2], block[3], (block[4] or "")
-                text = text.strip()
-                if len(text) < min_block_chars:
-                    continue
-                total_chars += len(text)
+    regions = ocr_regions(page, text_boxes, ocr_min_chars) if ocr_fallback else []
+    if regions:
+        results = None
+        if settings.ocr_cache_enabled:
+            cache_key = ocr_cache.make_key(hash_pdf_page(pdf, page), ocr_signature(ocr_dpi, ocr_min_chars))
+            results = ocr_cache.get(cache_key)
+        if results is None:
+            results, failed = [], False
+            with stage("ingest.ocr"):
+                for rect in regions:
+                    try:
+                        blocks, pix = ocr_region(page, rect, ocr_dpi)
+                    except Exception as e:
+                        logger.warning("OCR failed for %s page %d region %s: %s", pdf_path, page_index, tuple(rect), e)
+                        failed = True
+                        continue
+                    results.extend(blocks)
+                    if rect == page.rect:
+                        ocr_pix = pix
+            # A failed region would otherwise be cached as having no text
+            if settings.ocr_cache_enabled and not failed:
+                ocr_cache.put(cache_key, results)
+        results = drop_text_layer_overlaps(results, text_boxes)
+        if sum(len(text) for _, text in results) >= ocr_min_chars:
+            for (x0, y0, x1, y1), text in results:
                 documents.append(
                     Document(
                         page_content=text,
@@ -45,32 +149,18 @@ def extract_documents_from_pdf(
                             "source": pdf_path.split("/")[-1],
                             "page": page_index,
                             "bbox": f"{x0:.1f},{y0:.1f},{x1:.1f},{y1:.1f}",
+                            "ocr": True,
+                            **sheet,
                         },
                     )
                 )
 
-            # OCR fallback if page had almost no selectable text
-            if ocr_fallback and total_chars < min_block_chars:
-                pix = page.get_pixmap(dpi=ocr_dpi)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                text = pytesseract.image_to_string(img)
-                text = text.strip()
-                if len(text) >= min_block_chars:
-                    # For OCR, use full page as bounding box
-                    page_rect = page.rect
-                    documents.append(
-                        Document(
-                            page_content=text,
-                            metadata={
-                                "path": pdf_path,
-                                "source": pdf_path.split("/")[-1],
-                                "page": page_index,
-                                "bbox": f"{page_rect.x0:.1f},{page_rect.y0:.1f},{page_rect.x1:.1f},{page_rect.y1:.1f}",
-                                "ocr": True,
-                            },
-                        )
-                    )
+    if prerender_hash:
+        try:
+            with stage("ingest.prerender"):
+                prerender_page(page, page_index, prerender_hash, source_pix=ocr_pix)
+        except Exception as e:
+            # Renditions are only a viewer optimization; never fail extraction over them
+            logger.warning("Prerender failed for %s page %d: %s", pdf_path, page_index, e)
 
     return documents
-
-
@@ -0,0 +1,216 @@
+"""
+Two-level cache of rendered PDF page images (in-memory LRU + on-disk store)
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from .metrics import cache_result, stage
+from ..config import settings
+
+
+IMAGE_FORMATS = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def encode_image(img: "Image.Image", fmt: str) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt.upper(), quality=85)
+    return buf.getvalue()
+
+
+def encode_pixmap(pix: "fitz.Pixmap", fmt: str) -> bytes:
+    """Encode a pixmap as PNG (natively) or WebP/JPEG (through Pillow)."""
+    if fmt == "png":
+        return pix.tobytes("png")
+    return encode_image(Image.frombytes("RGB", [pix.width, pix.height], pix.samples), fmt)
+
+
+def render_page(pdf_path: str, page_num: int, dpi: int, fmt: str = "png") -> bytes:
+    with fitz.open(pdf_path) as pdf:
+        if page_num < 0 or page_num >= len(pdf):
+            raise IndexError(f"Page {page_num} out of range")
+        pix = pdf[page_num].get_pixmap(dpi=dpi, alpha=False)
+        return encode_pixmap(pix, fmt)
+
+
+def render_thumbnail(pdf_path: str, page_num: int, max_px: int, fmt: str = "png") -> bytes:
+    with fitz.open(pdf_path) as pdf:
+        if page_num < 0 or page_num >= len(pdf):
+            raise IndexError(f"Page {page_num} out of range")
+        page = pdf[page_num]
+        scale = max_px / max(page.rect.width, page.rect.height)
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+        return encode_pixmap(pix, fmt)
+
+
+def tile_grid(page_rect: "fitz.Rect", z: int, tile_size: int) -> Tuple[float, int, int]:
+    """Scale and tile counts for zoom level ``z``.
+
+    At ``z = 0`` the longer side of the page fits in one tile; every level
+    doubles the resolution.
+    """
+    scale = tile_size * (2 ** z) / max(page_rect.width, page_rect.height)
+    cols = math.ceil(page_rect.width * scale / tile_size)
+    rows = math.ceil(page_rect.height * scale / tile_size)
+    return scale, cols, rows
+
+
+def max_tile_zoom(page_rect: "fitz.Rect", tile_size: int, max_dpi: int) -> int:
+    """Deepest zoom level whose effective resolution stays within ``max_dpi``."""
+    z = 0
+    while tile_grid(page_rect, z + 1, tile_size)[0] * 72 <= max_dpi:
+        z += 1
+    return z
+
+
+def render_tile(pdf_path: str, page_num: int, z: int, x: int, y: int, tile_size: int, max_dpi: int, fmt: str = "png") -> bytes:
+    with fitz.open(pdf_path) as pdf:
+        if page_num < 0 or page_num >= len(pdf):
+            raise IndexError(f"Page {page_num} out of range")
+        page = pdf[page_num]
+        rect = page.rect
+        if z < 0 or z > max_tile_zoom(rect, tile_size, max_dpi):
+            raise IndexError(f"Zoom level {z} out of range")
+        scale, cols, rows = tile_grid(rect, z, tile_size)
+        if not (0 <= x < cols and 0 <= y < rows):
+            raise IndexError(f"Tile {x},{y} out of range")
+        step = tile_size / scale
+        clip = fitz.Rect(
+            rect.x0 + x * step,
+            rect.y0 + y * step,
+            min(rect.x0 + (x + 1) * step, rect.x1),
+            min(rect.y0 + (y + 1) * step, rect.y1),
+        )
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip, alpha=False)
+        return encode_pixmap(pix, fmt)
+
+
+class PageRenderCache:
+    """In-memory LRU (bounded by bytes) in front of an on-disk image store.
+
+    Keys are derived from the PDF's content hash, so a re-uploaded drawing
+    with the same name never serves stale images.
+    """
+
+    def __init__(self, directory: str, max_memory_bytes: int) -> None:
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(file_hash: str, page_num: int, dpi: int, fmt: str, variant: str = "") -> str:
+        """Cache key for a rendition; ``variant`` distinguishes tiles and thumbnails."""
+        parts = f"{file_hash}|{page_num}|{dpi}|{fmt}|{variant}"
+        return hashlib.sha256(parts.encode()).hexdigest()[:32]
+
+    @classmethod
+    def thumbnail_key(cls, file_hash: str, page_num: int, max_px: int, fmt: str) -> str:
+        return cls.make_key(file_hash, page_num, 0, fmt, variant=f"thumb/{max_px}")
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get_memory(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+        if data is not None:
+            cache_result("render", "memory_hit")
+        return data
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def contains(self, key: str) -> bool:
+        return self.get_memory(key) is not None or os.path.exists(self._disk_path(key))
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.get_memory(key)
+        if data is not None:
+            return data
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        cache_result("render", "disk_hit")
+        self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes, remember: bool = True) -> None:
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if remember:
+            self._remember(key, data)
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        data = self.get(key)
+        if data is None:
+            cache_result("render", "miss")
+            with stage("pdf.render"):
+                data = render()
+            self.put(key, data)
+        return data
+
+
+render_cache = PageRenderCache(settings.render_cache_dir, settings.render_cache_memory_mb * 1024 * 1024)
+
+
+def prerender_page(
+    page: "fitz.Page",
+    page_num: int,
+    file_hash: str,
+    *,
+    source_pix: Optional["fitz.Pixmap"] = None,
+) -> bool:
+    """Store the viewer's standard-DPI rendition and thumbnail for ``page``.
+
+    When ``source_pix`` is a higher-resolution raster of the same page (the
+    OCR render), it is downsampled instead of rasterizing the page again.
+    Returns False if both renditions were already cached.
+    """
+    fmt = settings.prerender_format
+    dpi = settings.render_default_dpi
+    thumb_px = settings.render_thumbnail_px
+    key = render_cache.make_key(file_hash, page_num, dpi, fmt)
+    thumb_key = render_cache.thumbnail_key(file_hash, page_num, thumb_px, fmt)
+    if render_cache.contains(key) and render_cache.contains(thumb_key):
+        return False
+
+    target = (page.rect * fitz.Matrix(dpi / 72, dpi / 72)).irect
+    if source_pix is not None and source_pix.width >= target.width and source_pix.n == 3:
+        img = Image.frombytes("RGB", [source_pix.width, source_pix.height], source_pix.samples)
+        img = img.resize((target.width, target.height), Image.LANCZOS)
+    else:
+        pix = page.get_pixmap(dpi=dpi, alpha=False)
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+    render_cache.put(key, encode_image(img, fmt), remember=False)
+    img.thumbnail((thumb_px, thumb_px), Image.LANCZOS)
+    render_cache.put(thumb_key, encode_image(img, fmt), remember=False)
+    return True
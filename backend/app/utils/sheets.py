@@ -0,0 +1,122 @@
+"""
+Sheet numbers, disciplines and metadata filters for drawing sets
+"""
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+
+# Discipline designators (US National CAD Standard)
+DISCIPLINES = {
+    "G": "general",
+    "H": "hazardous materials",
+    "V": "survey",
+    "B": "geotechnical",
+    "C": "civil",
+    "L": "landscape",
+    "S": "structural",
+    "A": "architectural",
+    "I": "interiors",
+    "Q": "equipment",
+    "F": "fire protection",
+    "FP": "fire protection",
+    "P": "plumbing",
+    "D": "process",
+    "M": "mechanical",
+    "E": "electrical",
+    "T": "telecommunications",
+    "R": "resource",
+    "X": "other disciplines",
+    "Z": "contractor/shop drawings",
+    "O": "operations",
+}
+
+# "A3.0.1", "A-6.3", "S101", "FP2.1"; a dotted level or three digits keeps
+# ordinary words and member sizes ("W12x26") out
+SHEET_RE = re.compile(r"\b([A-Z]{1,2})-?(\d{1,2}(?:\.\d{1,2}){1,2}|\d{3})\b", re.IGNORECASE)
+FILENAME_SHEET_RE = re.compile(r"^([A-Z]{1,2})-?(\d{1,3}(?:\.\d{1,2}){0,2})(?=[_\s-]|$)", re.IGNORECASE)
+
+
+def normalize_sheet(prefix: str, number: str) -> str:
+    return f"{prefix.upper()}{number}"
+
+
+def sheet_from_filename(filename: str) -> Optional[str]:
+    """Sheet number a drawing file is named after ("A-6.3_-_CERAMIC..." -> "A6.3")."""
+    match = FILENAME_SHEET_RE.match(os.path.basename(filename))
+    return normalize_sheet(*match.groups()) if match else None
+
+
+def sheet_series(sheet: str) -> List[str]:
+    """Every prefix a sheet belongs to: "A3.0.1" -> ["A", "A3", "A3.0", "A3.0.1"]."""
+    match = re.match(r"^([A-Z]{1,2})(\d+)((?:\.\d+)*)$", sheet)
+    if not match:
+        return [sheet]
+    letters, major, minors = match.groups()
+    series = [letters, f"{letters}{major}"]
+    for part in minors.split(".")[1:]:
+        series.append(f"{series[-1]}.{part}")
+    return series
+
+
+def sheet_discipline(sheet: str) -> Optional[str]:
+    letters = re.match(r"^[A-Z]+", sheet)
+    if not letters:
+        return None
+    return DISCIPLINES.get(letters.group()) or DISCIPLINES.get(letters.group()[0])
+
+
+def sheet_metadata(pdf_path: str) -> Dict[str, Any]:
+    """Chunk metadata derived from the drawing's file name."""
+    sheet = sheet_from_filename(pdf_path)
+    if sheet is None:
+        return {}
+    metadata: Dict[str, Any] = {"sheet": sheet, "sheet_series": sheet_series(sheet)}
+    discipline = sheet_discipline(sheet)
+    if discipline:
+        metadata["discipline"] = discipline
+    return metadata
+
+
+def detect_sheet_numbers(query: str) -> List[str]:
+    """Sheet numbers mentioned in a question, in order of appearance."""
+    return list(dict.fromkeys(normalize_sheet(*m.groups()) for m in SHEET_RE.finditer(query)))
+
+
+def build_metadata_filter(
+    *,
+    sources: Optional[Sequence[str]] = None,
+    sheets: Optional[Sequence[str]] = None,
+    sheet_prefix: Optional[str] = None,
+    discipline: Optional[str] = None,
+    page_min: Optional[int] = None,
+    page_max: Optional[int] = None,
+    ocr: Optional[bool] = None,
+) -> Optional[Dict[str, Any]]:
+    """Pinecone-syntax metadata filter; None when nothing is constrained."""
+    clauses: List[Dict[str, Any]] = []
+    if sources:
+        clauses.append({"source": {"$in": list(sources)}})
+    if sheets:
+        clauses.append({"sheet": {"$in": list(sheets)}})
+    if sheet_prefix:
+        match = FILENAME_SHEET_RE.match(sheet_prefix.strip())
+        prefix = normalize_sheet(*match.groups()) if match else sheet_prefix.strip().upper()
+        clauses.append({"sheet_series": {"$in": [prefix]}})
+    if discipline:
+        discipline = DISCIPLINES.get(discipline.upper(), discipline.lower())
+        clauses.append({"discipline": {"$eq": discipline}})
+    if page_min is not None or page_max is not None:
+        page: Dict[str, int] = {}
+        if page_min is not None:
+            page["$gte"] = page_min
+        if page_max is not None:
+            page["$lte"] = page_max
+        clauses.append({"page": page})
+    if ocr is not None:
+        clauses.append({"ocr": {"$eq": ocr}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
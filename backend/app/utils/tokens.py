@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Optional
+
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> Optional[Any]:
+    """tiktoken encoding for ``model``, loaded once per process.
+
+    Unknown models fall back to ``cl100k_base``. Returns None when the BPE
+    files are neither cached locally nor downloadable (offline hosts), in
+    which case callers fall back to a character-based estimate.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Rough estimate: ~4 chars per token
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
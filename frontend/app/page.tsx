@@ -13,7 +13,7 @@ type ChatMessage = {
   sources?: Array<{
     drawing_name: string;
     page_number: number;
-    score: number;
+    score: number | null;
   }>;
 };
 
@@ -62,10 +62,10 @@ export default function Home() {
       content: data.answer,
       confidence: data.confidence,
       drawings_referenced: data.drawings_referenced,
-      sources: data.sources?.map((s: { drawing_name?: string; page_number?: number; score?: number }) => ({
+      sources: data.sources?.map((s: { drawing_name?: string; page_number?: number; score?: number | null }) => ({
         drawing_name: s.drawing_name,
         page_number: s.page_number,
-        score: s.score,
+        score: s.score ?? null,
       })),
     };
     
@@ -120,7 +120,18 @@ export default function Home() {
         if (!silent) alert(`Upload failed: ${res.status}`);
         return;
       }
-      const data = await res.json();
+      let data = await res.json();
+      // Ingestion runs as a background job; poll until it finishes
+      while (data.status === "queued" || data.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 1500));
+        const statusRes = await fetch(`${apiBase}/upload/jobs/${data.job_id}`);
+        if (!statusRes.ok) break;
+        data = await statusRes.json();
+      }
+      if (data.status === "failed") {
+        if (!silent) alert(`Upload failed: ${data.error || "ingestion error"}`);
+        return;
+      }
       if (!silent) {
         setMessages((m) => [
           ...m,
@@ -213,7 +224,9 @@ export default function Home() {
                                     <span className="w-2 h-2 bg-blue-500 rounded-full"></span>
                                     <span className="font-medium">{source.drawing_name}</span>
                                     <span className="text-gray-500">Page {source.page_number}</span>
-                                    <span className="text-gray-400">({(source.score * 100).toFixed(0)}% match)</span>
+                                    {source.score != null && (
+                                      <span className="text-gray-400">({(source.score * 100).toFixed(0)}% match)</span>
+                                    )}
                                   </div>
                                 ))}
                                 {m.sources.length > 3 && (